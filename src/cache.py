@@ -0,0 +1,45 @@
+# cache.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+from collections import OrderedDict
+
+
+# Bounded fitness cache shared across generations.  Keys are content hashes
+# of a level (see Generator.level_hash) and values are the (fitness,
+# measurements) records from evaluation, so identical levels produced by
+# different individuals are only evaluated once.  The least recently used
+# entry is evicted once capacity is reached.
+class FitnessCache(object):
+    __slots__ = ["capacity", "entries", "hits", "misses"]
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        # cached result for key, or None
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return float(self.hits) / float(lookups)
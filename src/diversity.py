@@ -0,0 +1,76 @@
+# diversity.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+# Keeping the population from filling up with copies of the same level:
+# duplicate elimination on Generator.level_hash, a cheap grid distance on
+# packed bit-planes, crowding built on it, and population diversity stats.
+#
+import numpy as np
+from tiles import TILE_CODES
+
+CODES = TILE_CODES
+
+# bits set in every byte value, for numpy without bitwise_count
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def fingerprint(grid):
+    # Two packed bit-planes of a grid: tiles you can stand on, and tiles that
+    # hold something (entities, items, doors, weapons).  A level is 1 KB
+    # this way instead of 4 KB of tile codes.
+    walkable = (grid != CODES['stone']) & (grid != CODES['wall'])
+    occupied = walkable & (grid != CODES['floor'])
+    return np.packbits(np.stack([walkable, occupied]))
+
+
+def distances(one, others):
+    # Hamming distances (differing bits) from one fingerprint to each row of
+    # a stack of them
+    diff = np.bitwise_xor(others, one)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(diff.view(np.uint64)).sum(axis=1, dtype=np.int64)
+    return _POPCOUNT[diff].sum(axis=1, dtype=np.int64)
+
+
+def unique_children(survivors, children):
+    # children whose level is neither in the population nor bred twice
+    seen = set(x.level_hash for x in survivors)
+    result = []
+    for child in children:
+        if child.level_hash in seen:
+            continue
+        seen.add(child.level_hash)
+        result.append(child)
+    return result
+
+
+def crowd(population, children):
+    # Restricted tournament replacement: each child takes the place of the
+    # individual most like it, if it is fitter, so new levels compete with
+    # their look-alikes rather than with the whole population.
+    population = list(population)
+    fingerprints = np.stack([x.fingerprint for x in population])
+    for child in children:
+        nearest = int(np.argmin(distances(child.fingerprint, fingerprints)))
+        if child.fitness() > population[nearest].fitness():
+            population[nearest] = child
+            fingerprints[nearest] = child.fingerprint
+    return population
+
+
+def distinct(population):
+    # number of different levels, from the level hashes alone
+    return len(set(x.level_hash for x in population))
+
+
+def stats(population):
+    # (distinct levels, mean pairwise distance in bits).  The mean over all
+    # pairs comes from per-bit counts: a bit set in c of n fingerprints
+    # differs in c * (n - c) pairs.  Needs everyone's fingerprint.
+    n = len(population)
+    unique = distinct(population)
+    if n < 2:
+        return unique, 0.0
+    ones = np.unpackbits(np.stack([x.fingerprint for x in population]), axis=1).sum(axis=0, dtype=np.int64)
+    return unique, float((ones * (n - ones)).sum()) / (n * (n - 1) / 2)
@@ -4,29 +4,29 @@
 # Adapted from: A simple python dungeon generator by James Spencer
 #
 from __future__ import print_function
-import copy
-import heapq
+import argparse
+import collections
+import diversity
+import functools
+import glob
 import metrics
+import multiprocessing as mp
 import multiprocessing.pool as mpool
+import numpy as np
 import os
 import random
-import shutil
+import raster
+import selection
+from rooms import Room, RoomIndex, rooms_from_grid
+import shared
+import signal
 import time
 import math
-
-CHARACTER_TILES = {'stone': '*',
-                   'floor': '.',
-                   'wall': '#',
-                   'boss': 'B',
-                   'item': 'M',
-                   'enemy': 'E',
-                   'ranged': 'R',
-                   'trap': 'T',
-                   'door': '/',
-                   'key': 'K',
-                   'player': 'P',
-                   'weapon': 'W'
-                   }
+import zobrist
+from cache import FitnessCache
+from shared import SharedPopulation
+from tiles import CHARACTER_TILES, TILE_CODES, CHARACTER_CODES
+import tiles
 
 WIDTH = 64
 HEIGHT = 64
@@ -37,38 +37,98 @@ ROOMS_OVERLAP = False
 RANDOM_CONNECTIONS = 1
 RANDOM_SPURS = 3
 TILES = CHARACTER_TILES
+CODES = TILE_CODES
+# how many of the fittest individuals keep their grids between generations;
+# everyone else is rebuilt from room list and seed when a grid is needed
+ELITE_GENOMES = 4
+
+# Default fitness function: Just some arbitrary combination of a few criteria.  Is it good?  Who knows?
+# STUDENT Modify this, and possibly add more metrics.  Look at the implementation of metrics.py for
+# other keys.  Fitness is the weighted sum of the metrics named here.
+
+# difficulty curve
+COEFFICIENTS = dict(
+    freeSpace=0.6,
+    leniency=0.5,
+    freePercentage=0.6,
+    decorationPercentage = 0.5,
+    roomCount = 1,
+    legalPieces = 5,
+    keyReachable = 5,
+    bossReachable = 5,
+    solvable = 5
+)
+FITNESS_METRICS = list(COEFFICIENTS)
+WEIGHTS = np.array([COEFFICIENTS[m] for m in FITNESS_METRICS])
+# the path metrics cost two BFS runs per batch, so they are only worked out
+# when one of them is weighted
+WEIGHS_PATHS = any(m in metrics.distance.PATH_METRICS for m in FITNESS_METRICS)
+
+def evaluate_batch(grids, room_counts):
+    # Score a stack of levels with one metrics.batch_metrics call and return
+    # a (fitness, measurements) result record per level.  The fitness is
+    # each row of the metric matrix dotted with WEIGHTS, done as an
+    # elementwise product and row sum so a level scores the same whatever
+    # batch it lands in.
+    columns = metrics.batch_metrics(grids, room_counts, paths=WEIGHS_PATHS)
+    table = np.column_stack([columns[m] for m in FITNESS_METRICS])
+    fitnesses = (table * WEIGHTS).sum(axis=1).tolist()
+    rows = {name: column.tolist() for name, column in columns.items()}
+    return [(fitness, {name: rows[name][i] for name in rows}) for i, fitness in enumerate(fitnesses)]
+
+def evaluate(encoded):
+    # Score one level given as Generator.encode() and return only the
+    # (fitness, measurements) result record.
+    genome, room_list = encoded
+    if genome is None:
+        return 0, None
+    return evaluate_batch(genome[None], [len(room_list)])[0]
+
+def evaluate_slice(encodings):
+    # Pool task: evaluate a slice of Generator.encode() results as one batch.
+    return evaluate_batch(np.stack([genome for genome, _r in encodings]),
+                          [len(room_list) for _g, room_list in encodings])
 
 class Generator(object):
-    __slots__ = ["genome", "_fitness", "room_list", "corridor_list"]
+    __slots__ = ["genome", "_fitness", "measurements", "room_list", "corridor_list", "slot", "seed",
+                 "_level_hash", "_fingerprint", "_occupancy"]
 
     def __init__(self, room_list):
-        self.room_list = copy.deepcopy(room_list)
-        self.genome = []
+        # rooms are immutable, so the list is copied but the rooms are shared
+        self.room_list = list(room_list)
+        self.genome = None
         self.corridor_list = []
         
         self._fitness = None
+        self.measurements = None
+        # index into the shared population buffer, when the genome lives there
+        self.slot = None
+        # seed of the random stream build() paints the genome from; with the
+        # room list it determines the whole level, so the genome can be
+        # dropped and rebuilt.  None for levels loaded from disk.
+        self.seed = None
+        # Zobrist hash of the genome (see zobrist.py), kept when the genome
+        # is dropped, and its packed bit-planes (see diversity.py), made only
+        # when asked for and dropped with the genome unless crowding needs
+        # them
+        self._level_hash = None
+        self._fingerprint = None
+        # RoomIndex of room_list, built on first use and kept in step with it
+        # by add_room
+        self._occupancy = None
+
+    # The compact form sent to pool workers for evaluation: only what
+    # metrics needs, not the whole Generator.
+    def encode(self):
+        return (self.to_level(), self.room_list)
+
+    # Take a (fitness, measurements) result record from evaluate.
+    def merge(self, result):
+        self._fitness, self.measurements = result
+        return self
 
     def calculate_fitness(self):
-        if self.genome != []:
-            measurements = metrics.metrics(self.to_level(), self.room_list)
-            # Print out the possible measurements or look at the implementation of metrics.py for other keys:
-            # print(measurements.keys())
-            # Default fitness function: Just some arbitrary combination of a few criteria.  Is it good?  Who knows?
-            # STUDENT Modify this, and possibly add more metrics.  You can replace this with whatever code you like.
-
-            # difficulty curve
-            coefficients = dict(
-                freeSpace=0.6,
-                leniency=0.5,
-                freePercentage=0.6,
-                decorationPercentage = 0.5,
-                roomCount = 1,
-                legalPieces = 5
-            )
-            self._fitness = sum(map(lambda m: coefficients[m] * measurements[m], coefficients))
-        else:
-            self._fitness = 0
-        return self
+        return self.merge(evaluate(self.encode()))
     
     # Return the cached fitness value or calculate it as needed.
     def fitness(self):
@@ -79,248 +139,252 @@ class Generator(object):
     
     ############################################################################
     # MUTATE
-    def mutate(self, room_list):
+    def mutate(self, rng=random):
         global HEIGHT, WIDTH
-        self.corridor_list = []
-        genome = []
-        weapon_count = 0
-        MAX_WEAPON_COUNT = 3
-        weapon_positions = [()]
-        for i in range(HEIGHT):
-            genome.append([TILES['stone']] * WIDTH)
-
-        max_iters = random.randint(0, 2)
+        max_iters = rng.randint(0, 2)
 
         for a in range(max_iters):
-            if len(room_list) >= MAX_ROOMS:
+            if len(self.room_list) >= MAX_ROOMS:
                 break
 
-            tmp_room = self.gen_room()
+            tmp_room = self.gen_room(rng)
 
-            if room_list == []:
-                room_list.append(tmp_room)
+            if self.room_list == []:
+                self.add_room(tmp_room)
             else:
-                tmp_room = self.gen_room()
-                tmp_room_list = room_list[:]
+                tmp_room = self.gen_room(rng)
+
+                if self.room_overlapping(tmp_room) is False:
+                    self.add_room(tmp_room)
+
+        # the genome is painted from its own seed on demand, see to_level()
+        self.genome = None
+        self.seed = rng.getrandbits(64)
+        return self.room_list
+
+    # Lay corridors between the rooms of room_list and paint the genome.
+    def build(self, room_list, rng=random):
+        self.corridor_list = []
+        weapon_count = 0
+        MAX_WEAPON_COUNT = 3
+        weapon_positions = [()]
 
-                if self.room_overlapping(tmp_room, tmp_room_list) is False:
-                    room_list.append(tmp_room)
-        
         # connect the rooms
         for a in range(len(room_list) - 1):
-            self.join_rooms(room_list[a][0], room_list[a + 1][0])
+            self.join_rooms(room_list[a].rect, room_list[a + 1].rect, rng=rng)
 
         # do the random joins
         for a in range(RANDOM_CONNECTIONS):
             if len(room_list) > 1:
-                room_1 = room_list[random.randint(0, len(room_list) - 1)][0]
-                room_2 = room_list[random.randint(0, len(room_list) - 1)][0]
-                self.join_rooms(room_1, room_2)
+                room_1 = room_list[rng.randint(0, len(room_list) - 1)].rect
+                room_2 = room_list[rng.randint(0, len(room_list) - 1)].rect
+                self.join_rooms(room_1, room_2, rng=rng)
 
         # do the spurs
         for a in range(RANDOM_SPURS):
             if len(room_list) > 1:
-                room_1 = [random.randint(2, WIDTH - 2), random.randint(2, HEIGHT - 2), 1, 1]
-                room_2 = room_list[random.randint(0, len(room_list) - 1)][0]
-                self.join_rooms(room_1, room_2)
-
-        # fill the map, paint rooms
-        for room_num, room in enumerate(room_list):
-            for b in range(room[0][2]):
-                for c in range(room[0][3]):
-                    genome[room[0][1] + c][room[0][0] + b] = TILES['floor']
-
-        # paint corridors
-        corridor_list = self.corridor_list
-        for corridor in corridor_list:
-            x1, y1 = corridor[0]
-            x2, y2 = corridor[1]
-            for width in range(abs(x1 - x2) + 1):
-                for height in range(abs(y1 - y2) + 1):
-                    genome[min(y1, y2) + height][
-                        min(x1, x2) + width] = TILES['floor']
-
-            if len(corridor) == 3:
-                x3, y3 = corridor[2]
-
-                for width in range(abs(x2 - x3) + 1):
-                    for height in range(abs(y2 - y3) + 1):
-                        genome[min(y2, y3) + height][
-                            min(x2, x3) + width] = TILES['floor']
-
-        # paint the walls
-        for row in range(1, HEIGHT - 1):
-            for col in range(1, WIDTH - 1):
-                if genome[row][col] == TILES['floor']:
-                    if genome[row - 1][col - 1] == TILES['stone']:
-                        genome[row - 1][col - 1] = TILES['wall']
-
-                    if genome[row - 1][col] == TILES['stone']:
-                        genome[row - 1][col] = TILES['wall']
-
-                    if genome[row - 1][col + 1] == TILES['stone']:
-                        genome[row - 1][col + 1] = TILES['wall']
-
-                    if genome[row][col - 1] == TILES['stone']:
-                        genome[row][col - 1] = TILES['wall']
-
-                    if genome[row][col + 1] == TILES['stone']:
-                        genome[row][col + 1] = TILES['wall']
-
-                    if genome[row + 1][col - 1] == TILES['stone']:
-                        genome[row + 1][col - 1] = TILES['wall']
-
-                    if genome[row + 1][col] == TILES['stone']:
-                        genome[row + 1][col] = TILES['wall']
-
-                    if genome[row + 1][col + 1] == TILES['stone']:
-                        genome[row + 1][col + 1] = TILES['wall']
+                room_1 = [rng.randint(2, WIDTH - 2), rng.randint(2, HEIGHT - 2), 1, 1]
+                room_2 = room_list[rng.randint(0, len(room_list) - 1)].rect
+                self.join_rooms(room_1, room_2, rng=rng)
+
+        # paint rooms and corridors, then grow walls around them
+        genome = raster.rasterize(room_list, self.corridor_list, HEIGHT, WIDTH)
 
         # mutate the boss room to meet certain conditions
         for room in room_list:
-            x = room[0][0]
-            y = room[0][1]
-            w = room[0][2]
-            h = room[0][3]
+            x, y, w, h = room.rect
             row_start = y - 1
             row_end = y + h
             col_start = x - 1
             col_end = x + w
             
-            if 'B' in room[1]:
+            if room.tile == TILES['boss']:
                 # make sure all corners of room are a wall tile
-                if genome[row_start][col_start] != TILES['wall']:
-                    genome[row_start][col_start] == TILES['wall']
-                if genome[row_start][col_end] != TILES['wall']:
-                    genome[row_start][col_end] == TILES['wall']
-                if genome[row_end][col_start] != TILES['wall']:
-                    genome[row_end][col_start] == TILES['wall']
-                if genome[row_end][col_end] != TILES['wall']:
-                    genome[row_end][col_end] == TILES['wall']
+                if genome[row_start][col_start] != CODES['wall']:
+                    genome[row_start][col_start] == CODES['wall']
+                if genome[row_start][col_end] != CODES['wall']:
+                    genome[row_start][col_end] == CODES['wall']
+                if genome[row_end][col_start] != CODES['wall']:
+                    genome[row_end][col_start] == CODES['wall']
+                if genome[row_end][col_end] != CODES['wall']:
+                    genome[row_end][col_end] == CODES['wall']
                 
                 # make sure boundary rows have the appropriate number of walls
                 for x in range(col_start + 1, col_end, 1):
-                    if genome[row_start][x] == TILES['floor']:
-                        if genome[row_start][x - 1] == TILES['wall'] and genome[row_start][x + 1] == TILES['wall']:
+                    if genome[row_start][x] == CODES['floor']:
+                        if genome[row_start][x - 1] == CODES['wall'] and genome[row_start][x + 1] == CODES['wall']:
                             continue
-                        elif genome[row_start][x - 1] == TILES['wall'] and genome[row_start][x + 1] != TILES['wall']:
-                            genome[row_start][x + 1] = TILES['wall']
+                        elif genome[row_start][x - 1] == CODES['wall'] and genome[row_start][x + 1] != CODES['wall']:
+                            genome[row_start][x + 1] = CODES['wall']
                         else:
-                            genome[row_start][x - 1] = TILES['wall']
+                            genome[row_start][x - 1] = CODES['wall']
                 for x in range(col_start + 1, col_end, 1):
-                    if genome[row_end][x] == TILES['floor']:
-                        if genome[row_end][x - 1] == TILES['wall'] and genome[row_end][x + 1] == TILES['wall']:
+                    if genome[row_end][x] == CODES['floor']:
+                        if genome[row_end][x - 1] == CODES['wall'] and genome[row_end][x + 1] == CODES['wall']:
                             continue
-                        elif genome[row_end][x - 1] == TILES['wall'] and genome[row_end][x + 1] != TILES['wall']:
-                            genome[row_end][x + 1] = TILES['wall']
+                        elif genome[row_end][x - 1] == CODES['wall'] and genome[row_end][x + 1] != CODES['wall']:
+                            genome[row_end][x + 1] = CODES['wall']
                         else:
-                            genome[row_end][x - 1] = TILES['wall']
+                            genome[row_end][x - 1] = CODES['wall']
                 
                 # make sure boundary columns have the appropriate number of walls
                 for y in range(row_start + 1, row_end, 1):
-                    if genome[y][col_start] == TILES['floor']:
-                        if genome[y - 1][col_start] == TILES['wall'] and genome[y + 1][col_start] == TILES['wall']:
+                    if genome[y][col_start] == CODES['floor']:
+                        if genome[y - 1][col_start] == CODES['wall'] and genome[y + 1][col_start] == CODES['wall']:
                             continue
-                        elif genome[y - 1][col_start] == TILES['wall'] and genome[y + 1][col_start] != TILES['wall']:
-                            genome[y + 1][col_start] = TILES['wall']
+                        elif genome[y - 1][col_start] == CODES['wall'] and genome[y + 1][col_start] != CODES['wall']:
+                            genome[y + 1][col_start] = CODES['wall']
                         else:
-                            genome[y - 1][col_start] != TILES['wall']
+                            genome[y - 1][col_start] != CODES['wall']
                 for y in range(row_start + 1, row_end, 1):
-                    if genome[y][col_end] == TILES['floor']:
-                        if genome[y - 1][col_end] == TILES['wall'] and genome[y + 1][col_end] == TILES['wall']:
+                    if genome[y][col_end] == CODES['floor']:
+                        if genome[y - 1][col_end] == CODES['wall'] and genome[y + 1][col_end] == CODES['wall']:
                             continue
-                        elif genome[y - 1][col_end] == TILES['wall'] and genome[y + 1][col_end] != TILES['wall']:
-                            genome[y + 1][col_end] = TILES['wall']
+                        elif genome[y - 1][col_end] == CODES['wall'] and genome[y + 1][col_end] != CODES['wall']:
+                            genome[y + 1][col_end] = CODES['wall']
                         else:
-                            genome[y - 1][col_end] != TILES['wall']
+                            genome[y - 1][col_end] != CODES['wall']
 
         # place doors on boss room, weapons in rooms with enemies
         for room in room_list:
-            x = room[0][0]
-            y = room[0][1]
-            w = room[0][2]
-            h = room[0][3]
+            x, y, w, h = room.rect
             row_start = y - 1
             row_end = y + h
             col_start = x - 1
             col_end = x + w
 
-            if 'B' in room[1]:
+            if room.tile == TILES['boss']:
                 for y in range(row_start, row_end, 1):
-                    if genome[y][col_start] == TILES['floor']:
-                        genome[y][col_start] = TILES['door']
-                    if genome[y][col_end] == TILES['floor']:
-                        genome[y][col_end] = TILES['door']
+                    if genome[y][col_start] == CODES['floor']:
+                        genome[y][col_start] = CODES['door']
+                    if genome[y][col_end] == CODES['floor']:
+                        genome[y][col_end] = CODES['door']
                 for x in range(col_start, col_end, 1):
-                    if genome[row_start][x] == TILES['floor']:
-                        genome[row_start][x] = TILES['door']
-                    if genome[row_end][x] == TILES['floor']:
-                        genome[row_end][x] = TILES['door']
+                    if genome[row_start][x] == CODES['floor']:
+                        genome[row_start][x] = CODES['door']
+                    if genome[row_end][x] == CODES['floor']:
+                        genome[row_end][x] = CODES['door']
             
-            if ('E' in room[1] or 'R' in room[1]) and (weapon_count < MAX_WEAPON_COUNT):
+            if room.tile in (TILES['enemy'], TILES['ranged']) and (weapon_count < MAX_WEAPON_COUNT):
                 weapon_positions.append((y, x))
                 weapon_positions.append((row_end - 1, x))
                 weapon_positions.append((y, col_end - 1))
                 weapon_positions.append((row_end - 1, col_end - 1))
                 pos = ()
                 while pos == ():
-                    pos = random.choice(weapon_positions)
-                if genome[pos[0]][pos[1]] == TILES['floor']:
-                    genome[pos[0]][pos[1]] = 'W'
+                    pos = rng.choice(weapon_positions)
+                if genome[pos[0]][pos[1]] == CODES['floor']:
+                    genome[pos[0]][pos[1]] = CODES['weapon']
                     weapon_count += 1
 
-        for room_nums, rooms in enumerate(room_list):
-            genome[rooms[1][1]][rooms[1][0]] = rooms[1][2]
+        for room in room_list:
+            genome[room.yy, room.xx] = CHARACTER_CODES[room.tile]
 
+        self._level_hash = zobrist.grid_hash(genome)
         self.genome = genome
 
-        return room_list
-
-    def generate_children(self, other):
-        new_room_list = copy.deepcopy(self.room_list)
-
-        if len(new_room_list) > 1 and len(other.room_list) > 1:
-            split = random.randint(1, len(new_room_list)-1)
+    def generate_children(self, other, seed=None):
+        # All of the child's randomness comes from its own stream, so a given
+        # seed breeds the same child whichever process runs it.
+        if seed is None:
+            seed = random.getrandbits(64)
+        rng = random.Random(seed)
+        # work on copies of both parents; the rooms themselves are shared
+        first = Generator(self.room_list)
+        second = Generator(other.room_list)
+        protected = (TILES['player'], TILES['boss'], TILES['key'])
+
+        if len(first.room_list) > 1 and len(second.room_list) > 1:
+            split = rng.randint(1, len(first.room_list)-1)
             i = split
             while i < len(self.room_list):
-                cur_room = new_room_list[random.randint(0, len(new_room_list)-1)]
-                if 'P' in cur_room[1] or 'B' in cur_room[1] or 'K' in cur_room[1]:
+                cur_room = first.room_list[rng.randint(0, len(first.room_list)-1)]
+                if cur_room.tile in protected:
                     i += 1
                     continue
                 else:
-                    del new_room_list[random.randint(0, len(new_room_list)-1)]
+                    first.remove_room(rng.randint(0, len(first.room_list)-1))
                     i += 1
             i = split
-            while i < len(other.room_list):
-                cur_room = other.room_list[random.randint(0, len(other.room_list) - 1)]
-                if 'P' in cur_room[1] or 'B' in cur_room[1] or 'K' in cur_room[1]:
+            while i < len(second.room_list):
+                cur_room = second.room_list[rng.randint(0, len(second.room_list) - 1)]
+                if cur_room.tile in protected:
                     i += 1
                     continue
                 else:
-                    del other.room_list[random.randint(0, len(other.room_list) - 1)]
+                    second.remove_room(rng.randint(0, len(second.room_list) - 1))
                     i += 1
-            chance = random.random()
+            # the child is one trimmed parent, taking the other's rooms that
+            # fit
+            chance = rng.random()
             if chance > .5:
-                for temp in other.room_list:
-                    if self.room_overlapping(temp, new_room_list) == False:
-                        new_room_list.append(temp)
+                child, extra = first, second.room_list
             else:
-                for temp in new_room_list:
-                    if self.room_overlapping(temp, other.room_list) == False:
-                        other.room_list.append(temp)
-                new_room_list = other.room_list
+                child, extra = second, first.room_list
         else:
-            if len(other.room_list) > 0:
-                for temp in other.room_list:
-                    if self.room_overlapping(temp, new_room_list) == False:
-                        new_room_list.append(temp)
-                # new_room_list.append(other.room_list[0])
-        # do mutation
-        return Generator(self.mutate(new_room_list))
-
+            child, extra = first, second.room_list
+            # new_room_list.append(other_room_list[0])
+        for temp in extra:
+            if child.room_overlapping(temp) == False:
+                child.add_room(temp)
+        # do mutation on the child, not self, so the paint seed lands on the
+        # individual whose room list it belongs to
+        child.mutate(rng)
+        return child
+
+    # Zobrist hash of the level's grid, stable across processes and runs, so
+    # it can key the fitness cache and spot duplicate levels.  build()
+    # hashes the grid it paints; loaded levels are hashed on first use.  None
+    # for an empty dungeon.
+    @property
+    def level_hash(self):
+        if self._level_hash is None:
+            level = self.to_level()
+            if self._level_hash is None and level is not None:
+                self._level_hash = zobrist.grid_hash(level)
+        return self._level_hash
+
+    # Packed bit-planes of the level for grid distances (see diversity.py),
+    # painting the level if need be.
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            level = self.to_level()
+            if self._fingerprint is None and level is not None:
+                self._fingerprint = diversity.fingerprint(level)
+        return self._fingerprint
+
+    # The genome as a 2-D uint8 grid of tile codes (see tiles.py), painted
+    # from the room list and seed if it is not held.
     def to_level(self):
+        if self.genome is None and self.seed is not None:
+            self.build(self.room_list, random.Random(self.seed))
         return self.genome
 
+    # Let go of the genome if it can be rebuilt, keeping only the room list
+    # and seed, and of its fingerprint unless asked to keep it.  Grids in the
+    # shared buffer and loaded levels stay.  The corridors (only needed while
+    # painting, and laid again by build()) and the measurements behind the
+    # fitness always go.
+    def drop_genome(self, keep_fingerprint=False):
+        self._occupancy = None
+        self.corridor_list = []
+        self.measurements = None
+        if self.seed is not None and self.slot is None:
+            self.genome = None
+            if not keep_fingerprint:
+                self._fingerprint = None
+
+    # Give up the shared buffer slot, keeping a private copy of the genome.
+    def detach(self):
+        if self.slot is not None:
+            self.genome = self.genome.copy()
+            self.slot = None
+
+    # The genome as text rows, for writing level files.
+    def to_text(self):
+        return tiles.to_lines(self.to_level())
+
     @classmethod
     def empty_dungeon(cls):
         # build an empty dungeon, blank the room and corridor lists
@@ -329,45 +393,79 @@ class Generator(object):
         return cls(r)
 
 
-    def gen_room(self):
+    @classmethod
+    def random_dungeon(cls, seed=None):
+        # A random valid dungeon: non-overlapping random rooms holding
+        # exactly one player, boss and key, to be connected and painted on
+        # demand.  Like children, it is drawn from its own seeded stream.
+        if seed is None:
+            seed = random.getrandbits(64)
+        rng = random.Random(seed)
+        individual = cls([])
+        room_list = individual.room_list
+        special = [TILES['player'], TILES['boss'], TILES['key']]
+        others = [TILES['item'], TILES['enemy'], TILES['ranged'], TILES['trap']]
+        target = rng.randint(len(special), MAX_ROOMS)
+        attempts = 0
+        while len(room_list) < len(special) or (len(room_list) < target and attempts < 4 * MAX_ROOMS):
+            attempts += 1
+            room = individual.gen_room(rng)
+            if individual.room_overlapping(room):
+                continue
+            if len(room_list) < len(special):
+                room = room._replace(tile=special[len(room_list)])
+            else:
+                room = room._replace(tile=rng.choice(others))
+            individual.add_room(room)
+        rng.shuffle(room_list)
+        individual.seed = rng.getrandbits(64)
+        return individual
+
+    @classmethod
+    def from_level_file(cls, path):
+        # An individual whose genome is a level on disk, with a room list
+        # recovered from the grid so it can take part in crossover.
+        genome = tiles.read_level(path)
+        individual = cls(rooms_from_grid(genome))
+        individual.genome = genome
+        return individual
+
+    def gen_room(self, rng=random):
         x, y, w, h, xx, yy = 0, 0, 0, 0, 0, 0
         tile = TILES['floor']
 
-        w = random.randint(MIN_ROOM_XY, MAX_ROOM_XY)
-        h = random.randint(MIN_ROOM_XY, MAX_ROOM_XY)
-        x = random.randint(1, (WIDTH - w - 1))
-        y = random.randint(1, (HEIGHT - h - 1))
-        xx = random.randint(x, (x + w - 1))
-        yy = random.randint(y, (y + h - 1))
-        tile = random.choice([TILES['player'], TILES['boss'], TILES['item'], TILES['enemy'], TILES['ranged'], TILES['key'], TILES['trap']])
-
-        return [[x, y, w, h], [xx, yy, tile]]
-
-    def room_overlapping(self, room, room_list):
-
-        x = room[0][0]
-        y = room[0][1]
-        w = room[0][2]
-        h = room[0][3]
-
-        #print("x: ", x, "y: ", y, "w: ", w, "h: ", h)
-        #print("room list: ", room_list)
-
-        for current_room in room_list:
-            #print("current room: ", current_room)
-            # The rectangles don't overlap if
-            # one rectangle's minimum in some dimension
-            # is greater than the other's maximum in
-            # that dimension.
-            if (x < (current_room[0][0] + current_room[0][2]) and current_room[0][0] < (x + w + 1) and y < (current_room[0][1] + current_room[0][3]) and current_room[0][1] < (y + h + 1)):
-                #print("x: ", x, "y: ", y, "w: ", w, "h: ", h)
-                #print("room list: ", room_list)
-                #print("current room: ", current_room)
-                return True
-        return False
-
-
-    def corridor_between_points(self, x1, y1, x2, y2, join_type='either'):
+        w = rng.randint(MIN_ROOM_XY, MAX_ROOM_XY)
+        h = rng.randint(MIN_ROOM_XY, MAX_ROOM_XY)
+        x = rng.randint(1, (WIDTH - w - 1))
+        y = rng.randint(1, (HEIGHT - h - 1))
+        xx = rng.randint(x, (x + w - 1))
+        yy = rng.randint(y, (y + h - 1))
+        tile = rng.choice([TILES['player'], TILES['boss'], TILES['item'], TILES['enemy'], TILES['ranged'], TILES['key'], TILES['trap']])
+
+        return Room(x, y, w, h, xx, yy, tile)
+
+    def room_overlapping(self, room):
+        return self.occupancy().overlaps(room)
+
+    # Append a room to the room list and to its occupancy index.
+    def add_room(self, room):
+        self.room_list.append(room)
+        self.occupancy().add(room)
+
+    # Take the room at position i out of the room list and its occupancy
+    # index.
+    def remove_room(self, i):
+        occupancy = self.occupancy()
+        occupancy.remove(self.room_list.pop(i))
+
+    # The RoomIndex of the room list, built the first time it is needed.
+    def occupancy(self):
+        if self._occupancy is None:
+            self._occupancy = RoomIndex(self.room_list, HEIGHT, WIDTH)
+        return self._occupancy
+
+
+    def corridor_between_points(self, x1, y1, x2, y2, join_type='either', rng=random):
         if x1 == x2 and y1 == y2 or x1 == x2 or y1 == y2:
             return [(x1, y1), (x2, y2)]
         else:
@@ -382,7 +480,7 @@ class Generator(object):
             elif join_type == 'either' and set([WIDTH - 1, WIDTH - 2]).intersection(set([x1, x2])) or set([HEIGHT - 1, HEIGHT - 2]).intersection(set([y1, y2])):
                 join = 'top'
             elif join_type == 'either':
-                join = random.choice(['top', 'bottom'])
+                join = rng.choice(['top', 'bottom'])
             else:
                 join = join_type
 
@@ -391,7 +489,7 @@ class Generator(object):
             elif join == 'bottom':
                 return [(x1, y1), (x2, y1), (x2, y2)]
 
-    def join_rooms(self, room_1, room_2, join_type='either'):
+    def join_rooms(self, room_1, room_2, join_type='either', rng=random):
         # sort by the value of x
         sorted_room = [room_1, room_2]
         sorted_room.sort(key=lambda x_y: x_y[0])
@@ -412,85 +510,193 @@ class Generator(object):
 
         # overlapping on x
         if x1 < (x2 + w2) and x2 < (x1 + w1):
-            jx1 = random.randint(x2, x1_2)
+            jx1 = rng.randint(x2, x1_2)
             jx2 = jx1
             tmp_y = [y1, y2, y1_2, y2_2]
             tmp_y.sort()
             jy1 = tmp_y[1] + 1
             jy2 = tmp_y[2] - 1
 
-            corridors = self.corridor_between_points(jx1, jy1, jx2, jy2)
+            corridors = self.corridor_between_points(jx1, jy1, jx2, jy2, rng=rng)
             self.corridor_list.append(corridors)
 
         # overlapping on y
         elif y1 < (y2 + h2) and y2 < (y1 + h1):
             if y2 > y1:
-                jy1 = random.randint(y2, y1_2)
+                jy1 = rng.randint(y2, y1_2)
                 jy2 = jy1
             else:
-                jy1 = random.randint(y1, y2_2)
+                jy1 = rng.randint(y1, y2_2)
                 jy2 = jy1
             tmp_x = [x1, x2, x1_2, x2_2]
             tmp_x.sort()
             jx1 = tmp_x[1] + 1
             jx2 = tmp_x[2] - 1
 
-            corridors = self.corridor_between_points(jx1, jy1, jx2, jy2)
+            corridors = self.corridor_between_points(jx1, jy1, jx2, jy2, rng=rng)
             self.corridor_list.append(corridors)
 
         # no overlap
         else:
             join = None
             if join_type == 'either':
-                join = random.choice(['top', 'bottom'])
+                join = rng.choice(['top', 'bottom'])
             else:
                 join = join_type
 
             if join == 'top':
                 if y2 > y1:
                     jx1 = x1_2 + 1
-                    jy1 = random.randint(y1, y1_2)
-                    jx2 = random.randint(x2, x2_2)
+                    jy1 = rng.randint(y1, y1_2)
+                    jx2 = rng.randint(x2, x2_2)
                     jy2 = y2 - 1
                     corridors = self.corridor_between_points(
-                        jx1, jy1, jx2, jy2, 'bottom')
+                        jx1, jy1, jx2, jy2, 'bottom', rng=rng)
                     self.corridor_list.append(corridors)
                 else:
-                    jx1 = random.randint(x1, x1_2)
+                    jx1 = rng.randint(x1, x1_2)
                     jy1 = y1 - 1
                     jx2 = x2 - 1
-                    jy2 = random.randint(y2, y2_2)
+                    jy2 = rng.randint(y2, y2_2)
                     corridors = self.corridor_between_points(
-                        jx1, jy1, jx2, jy2, 'top')
+                        jx1, jy1, jx2, jy2, 'top', rng=rng)
                     self.corridor_list.append(corridors)
 
             elif join == 'bottom':
                 if y2 > y1:
-                    jx1 = random.randint(x1, x1_2)
+                    jx1 = rng.randint(x1, x1_2)
                     jy1 = y1_2 + 1
                     jx2 = x2 - 1
-                    jy2 = random.randint(y2, y2_2)
+                    jy2 = rng.randint(y2, y2_2)
                     corridors = self.corridor_between_points(
-                        jx1, jy1, jx2, jy2, 'top')
+                        jx1, jy1, jx2, jy2, 'top', rng=rng)
                     self.corridor_list.append(corridors)
                 else:
                     jx1 = x1_2 + 1
-                    jy1 = random.randint(y1, y1_2)
-                    jx2 = random.randint(x2, x2_2)
+                    jy1 = rng.randint(y1, y1_2)
+                    jx2 = rng.randint(x2, x2_2)
                     jy2 = y2_2 + 1
                     corridors = self.corridor_between_points(
-                        jx1, jy1, jx2, jy2, 'bottom')
+                        jx1, jy1, jx2, jy2, 'bottom', rng=rng)
                     self.corridor_list.append(corridors)
 
-def generate_successors(population):
+# Fitness cache of the parent process, keyed on level content and consulted
+# only by evaluate_population, before anything goes to the pool.  Workers
+# never use it.
+_fitness_cache = FitnessCache()
+
+# Pool task size, in levels, when a deadline is set (see map_until).  The
+# deadline can be overrun by about one task's worth of work.
+DEADLINE_CHUNK = 8
+
+def split(items, parts):
+    # items cut into at most `parts` contiguous slices, one per pool task
+    size = max(1, int(math.ceil(len(items) / float(parts))))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def map_until(pool, task, items, parts, deadline=None):
+    # Run a pool task that maps a list to a list over items and join the
+    # results, cut into `parts` slices.  With a deadline (a time.monotonic()
+    # value) the items go out in DEADLINE_CHUNK slices instead, no more than
+    # `parts` at a time, and nothing is submitted once the deadline has
+    # passed.  The slices already running are waited for, so no task
+    # outlives the call to eat into the next one's time.  Returns the items
+    # of the slices that ran, in order, and whether that was all of them.
+    if deadline is None:
+        return sum(pool.map(task, split(items, parts), 1), []), True
+    chunks = [items[i:i + DEADLINE_CHUNK] for i in range(0, len(items), DEADLINE_CHUNK)]
+    running = collections.deque()
     results = []
-
-    best_fit = sorted(population, key=lambda x: x.fitness(), reverse=True)
+    for chunk in chunks:
+        if time.monotonic() >= deadline:
+            break
+        if len(running) >= parts:
+            results.append(running.popleft().get())
+        running.append(pool.apply_async(task, (chunk,)))
+    while running:
+        results.append(running.popleft().get())
+    return sum(results, []), len(results) == len(chunks)
+
+def score(individuals):
+    # Evaluate a slice of new individuals as one batch.
+    if individuals:
+        results = evaluate_batch(np.stack([x.to_level() for x in individuals]),
+                                 [len(x.room_list) for x in individuals])
+        for individual, result in zip(individuals, results):
+            individual.merge(result)
+    return individuals
+
+def breed_children(pairs):
+    # Crossover, mutation and fitness for a slice of children.  Crossover
+    # only needs the parents' room lists, plus the seed of the child's
+    # random stream.
+    return score([Generator(room_list).generate_children(Generator(other_room_list), seed)
+                  for room_list, other_room_list, seed in pairs])
+
+def breed_slice(pairs, fingerprints=False):
+    # Pool task: breed a slice of children and send back their descriptions,
+    # not their grids.  With fingerprints, for crowding, each child takes its fingerprint along.
+    children = breed_children(pairs)
+    for child in children:
+        if fingerprints:
+            child.fingerprint
+        child.drop_genome(keep_fingerprint=fingerprints)
+    return children
+
+def breed(pair):
+    # Pool task: one child, for callers that breed them one at a time.
+    return breed_slice([pair])[0]
+
+def to_buffer(individuals, slots):
+    # Worker side of a shared memory population: write each individual's
+    # grid into its slot of the buffer and send back everything but the
+    # grids.
+    records = []
+    for individual, slot in zip(individuals, slots):
+        shared.worker_grids()[slot] = individual.to_level()
+        records.append((individual.room_list, individual.seed, individual.level_hash, individual._fitness,
+                        individual.measurements))
+    return records
+
+def from_buffer(records, slots, population_buffer):
+    # Parent side: individuals for to_buffer's records, holding views of
+    # their slots.
+    individuals = []
+    for slot, (room_list, seed, level_hash, fitness, measurements) in zip(slots, records):
+        individual = Generator(room_list)
+        individual.seed = seed
+        individual._level_hash = level_hash
+        individual.slot = slot
+        individual.genome = population_buffer.grids[slot]
+        individuals.append(individual.merge((fitness, measurements)))
+    return individuals
+
+def breed_shared(tasks):
+    # Pool task for a shared memory population: breed a slice of children
+    # straight into their slots of the buffer.
+    return to_buffer(breed_children([task[:3] for task in tasks]), [task[3] for task in tasks])
+
+def breed_into_buffer(pool, pairs, batches, population_buffer):
+    tasks = [(room_list, other_room_list, seed, population_buffer.allocate())
+             for room_list, other_room_list, seed in pairs]
+    records = sum(pool.map(breed_shared, split(tasks, batches), 1), [])
+    return from_buffer(records, [task[3] for task in tasks], population_buffer)
+
+def release_slots(individuals, population_buffer):
+    # recycle the slots of individuals leaving the population
+    for individual in individuals:
+        if individual.slot is not None:
+            population_buffer.release(individual.slot)
+            individual.slot = None
+            individual.genome = None
+
+def select_parents(population, verbose=True, scheme=selection.truncation, rng=random, pop_limit=None):
+    fitnesses = [x.fitness() for x in population]
 
     # # ----- Elitism Selection ------
     # elitism_percentage = 0.01
-    # elitism_size = max(1, int(len(best_fit) * elitism_percentage))
-    # elitism_selection = best_fit[:elitism_size]
+    # elitism_size = max(1, int(len(population) * elitism_percentage))
+    # elitism_selection = [population[i] for i in selection.strongest(fitnesses, elitism_size)]
     #
     # print("== Elitism {} getting {}".format(len(population), elitism_size))
     #
@@ -498,95 +704,381 @@ def generate_successors(population):
 
     # ----- Steady State Selection ------
     steady_state_percentage = 0.25
-    steady_state_size = max(1, int(len(best_fit) * steady_state_percentage))
-    print("== steady state {} getting {}".format(len(population), steady_state_size))
-
-    steady_state_high = best_fit[:steady_state_size]
-    steady_state_low = best_fit[-steady_state_size:]
-
-    # remove low percentage
-    steady_state_results = list(set(best_fit) - set(steady_state_low))
-
-    for i in steady_state_high:
-        steady_state_results.append(i.generate_children(random.choice(steady_state_high)))
-
-    results += steady_state_results
+    steady_state_size = max(1, int(len(population) * steady_state_percentage))
+    if verbose:
+        print("== steady state {} getting {}".format(len(population), steady_state_size))
+
+    # remove low percentage, keeping the survivors in population order
+    steady_state_low = set(selection.weakest(fitnesses, steady_state_size))
+    steady_state_results = [x for i, x in enumerate(population) if i not in steady_state_low]
+
+    # breed at least the steady state share, and enough to fill the
+    # population back up to pop_limit if duplicates left it short
+    count = steady_state_size
+    if pop_limit is not None:
+        count = max(count, pop_limit - len(steady_state_results))
+
+    # each pair carries the seed for its child's random stream
+    pairs = [(population[i].room_list, population[j].room_list, rng.getrandbits(64))
+             for i, j in scheme(fitnesses, count, rng)]
+    return steady_state_results, pairs
+
+def generate_successors(population, pool=None, batches=1, population_buffer=None,
+                        pop_limit=480, verbose=True, scheme=selection.truncation, deadline=None,
+                        rng=random, crowding=False):
+    # The parent only picks survivors and parent pairs; with a pool, breeding
+    # and evaluating the children happens in the workers.  With a shared
+    # population buffer the dropped individuals' slots are recycled for the
+    # children before breeding.  If breeding in the pool runs into the
+    # deadline (a time.monotonic() value, see map_until) the generation is
+    # abandoned with multiprocessing.TimeoutError.  All of the
+    # parent's random draws (selection and the children's seeds) come from
+    # rng, so a seeded rng gives the same generation for any number of
+    # workers.  Children that repeat a level already in the population are
+    # dropped.  With crowding nobody is dropped up front; each child instead
+    # competes with the individual most like it (see diversity.crowd).
+    results, pairs = select_parents(population, verbose, scheme, rng, pop_limit)
+    if crowding:
+        results = list(population)
+
+    if population_buffer is not None:
+        survivors = set(results)
+        release_slots([i for i in population if i not in survivors], population_buffer)
+        children = breed_into_buffer(pool, pairs, batches, population_buffer)
+    elif pool is None:
+        children = breed_slice(pairs, crowding)
+    else:
+        children, finished = map_until(pool, functools.partial(breed_slice, fingerprints=crowding), pairs,
+                                       batches, deadline)
+        if not finished:
+            raise mp.TimeoutError("generation abandoned at the deadline")
+
+    unique = diversity.unique_children(results, children)
+    if verbose and len(unique) < len(children):
+        print("== {} duplicate children dropped".format(len(children) - len(unique)))
+    if crowding:
+        results = diversity.crowd(results, unique)
+    else:
+        results += unique
+        over_count = len(results) - pop_limit
+        if over_count > 0:
+            if verbose:
+                print("== {} individuals over limit".format(over_count))
+            trimmed = set(selection.weakest([x.fitness() for x in results], over_count))
+            results = [x for i, x in enumerate(results) if i not in trimmed]
+    if population_buffer is not None:
+        kept = set(results)
+        release_slots([x for x in population + children if x not in kept], population_buffer)
+
+    # only the elite hold on to their grids and measurements, and with
+    # crowding everyone to their fingerprints
+    elite = set(selection.strongest([x.fitness() for x in results], ELITE_GENOMES))
+    for i, individual in enumerate(results):
+        if i not in elite:
+            individual.drop_genome(keep_fingerprint=crowding)
+    return results
 
-    results.sort(key=lambda x: x.fitness(), reverse=True)
-    over_count = len(results) - 480
-    if over_count > 0:
-        print("== {} individuals over limit".format(over_count))
-        results = results[:-over_count]
+def random_individuals(seeds):
+    # Pool task: a slice of random dungeons, each drawn from its own seed,
+    # evaluated and sent back without their grids.
+    individuals = score([Generator.random_dungeon(seed) for seed in seeds])
+    for individual in individuals:
+        individual.drop_genome()
+    return individuals
+
+def random_shared(tasks):
+    # Pool task for a shared memory population: random dungeons, one per
+    # (seed, slot) task, built straight into their slots of the buffer.
+    return to_buffer(score([Generator.random_dungeon(seed) for seed, _slot in tasks]),
+                     [slot for _seed, slot in tasks])
+
+# Levels that can be mixed into the initial population.
+LEVEL_FILES = ["../levels/*.txt", "game/level_*.txt"]
+
+def initial_population(pool, pop_limit, batches, level_paths=(), deadline=None, rng=random,
+                       population_buffer=None):
+    # Random valid dungeons built and evaluated in the pool, with the given
+    # level files (those of the right size) mixed in.  With a shared
+    # population buffer every grid goes into a slot of it from the start.
+    # With a deadline the population holds whatever was built by then.
+    population = []
+    for path in level_paths:
+        individual = Generator.from_level_file(path)
+        if individual.genome.shape == (HEIGHT, WIDTH) and len(population) < pop_limit:
+            if population_buffer is not None:
+                individual.slot = population_buffer.allocate()
+                population_buffer.grids[individual.slot] = individual.genome
+                individual.genome = population_buffer.grids[individual.slot]
+            population.append(individual)
+    population = evaluate_population(pool, population, batches)
+    seeds = [rng.getrandbits(64) for _g in range(pop_limit - len(population))]
+    if seeds and population_buffer is not None:
+        tasks = [(seed, population_buffer.allocate()) for seed in seeds]
+        records = sum(pool.map(random_shared, split(tasks, batches), 1), [])
+        population += from_buffer(records, [slot for _seed, slot in tasks], population_buffer)
+    elif seeds:
+        population += map_until(pool, random_individuals, seeds, batches, deadline)[0]
+    return population
 
-    return results
+def init_worker(shared_args=None):
+    # Leave Ctrl-C to the parent, which stops the run and tears the pool down;
+    # a worker interrupted mid-task can leave pool.map waiting forever.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if shared_args is not None:
+        shared.attach(*shared_args)
+
+def evaluate_population(pool, population, batches):
+    # Fill in fitness from the cache where possible and only send the rest to
+    # the pool.  Individuals that already carry a fitness (the survivors of
+    # the last generation) are not sent at all.  The cache is keyed on the
+    # level's content, so the same level file or level met again in later
+    # runs of this process is not evaluated twice.
+    pending = []
+    for individual in population:
+        if individual._fitness is not None:
+            continue
+        result = None
+        if individual.level_hash is not None:
+            result = _fitness_cache.get(individual.level_hash)
+        if result is None:
+            pending.append(individual)
+        else:
+            individual.merge(result)
+    if pending:
+        # workers get slices of compact encodings and send back only result
+        # records
+        results = sum(pool.map(evaluate_slice, split([i.encode() for i in pending], batches), 1), [])
+        for individual, result in zip(pending, results):
+            individual.merge(result)
+            if individual.level_hash is not None:
+                _fitness_cache.put(individual.level_hash, result)
+    return population
 
-def dungeon():
+def dungeon(shared_population=False, scheme=selection.truncation, level_paths=(), seed=None,
+            generations=None, processes=None, crowding=False):
     # STUDENT Feel free to play with this parameter
     pop_limit = 480
+    # Every random draw in the run descends from this one seed, so a seeded
+    # run evolves the same levels whatever the number of processes.
+    rng = random.Random(seed)
     # Code to parallelize some computations
-    batches = os.cpu_count()
+    if processes is None:
+        processes = os.cpu_count()
+    batches = processes
     if pop_limit % batches != 0:
         print("It's ideal if pop_limit divides evenly into " + str(batches) + " batches.")
-    batch_size = int(math.ceil(pop_limit / batches))
-    with mpool.Pool(processes=os.cpu_count()) as pool:
-        init_time = time.time()
-        # STUDENT (Optional) change population initialization - can get to better results quicker
-        population = [Generator.empty_dungeon()
-                      for _g in range(pop_limit)]
-        # But leave this line alone; we have to reassign to population because we get a new population that has more cached stuff in it.
-        population = pool.map(Generator.calculate_fitness,
-                              population,
-                              batch_size)
-        init_done = time.time()
-        print("Created and calculated initial population statistics in:", init_done - init_time, "seconds")
-        generation = 0
-        start = time.time()
-        now = start
-        print("Use ctrl-c to terminate this loop manually.")
-        try:
-            while True:
-                now = time.time()
-                # Print out statistics
-                if generation > 0:
-                    best = max(population, key=Generator.fitness)
-                    print("Generation:", str(generation))
-                    print("Max fitness:", str(best.fitness()))
-                    print("Average generation time:", (now - start) / generation)
-                    print("Net time:", now - start)
-                    with open("../levels/last.txt", 'w') as f:
-                        for row in best.to_level():
-                            f.write("".join(row) + "\n")
-                    # Generator.gen_tiles_level()
-                generation += 1
-                # STUDENT Determine stopping condition - creates a folder called levels and puts the gen levels in folder
-                stop_condition = False
-                if stop_condition:
-                    break
-                # STUDENT Also consider using FI-2POP as in the Sorenson & Pasquier paper
-                gentime = time.time()
-                next_population = generate_successors(population)
-                gendone = time.time()
-                print("Generated successors in:", gendone - gentime, "seconds")
-                # Calculate fitness in batches in parallel -  a good place to mod
-                next_population = pool.map(Generator.calculate_fitness,
-                                           next_population,
-                                           batch_size)
-                popdone = time.time()
-                print("Calculated fitnesses in:", popdone - gendone, "seconds")
-                population = next_population
-        except KeyboardInterrupt:
-            pass
+    # Optionally keep every grid in one shared memory block the workers map
+    # once at start-up, so no grids are pickled in the loop.
+    population_buffer = None
+    initargs = ()
+    if shared_population:
+        # with crowding the whole population is still alive while its
+        # children are bred, so leave room for both
+        slots = 2 * pop_limit if crowding else pop_limit
+        population_buffer = SharedPopulation(slots, HEIGHT, WIDTH)
+        initargs = (population_buffer.initargs(),)
+    population = []
+    try:
+        with mpool.Pool(processes=processes, initializer=init_worker, initargs=initargs) as pool:
+            init_time = time.time()
+            # STUDENT (Optional) change population initialization - can get to better results quicker
+            # Random valid dungeons built in the pool, plus any level files
+            population = initial_population(pool, pop_limit, batches, level_paths, rng=rng,
+                                            population_buffer=population_buffer)
+            init_done = time.time()
+            print("Created and calculated initial population statistics in:", init_done - init_time, "seconds")
+            generation = 0
+            start = time.time()
+            now = start
+            print("Use ctrl-c to terminate this loop manually.")
+            try:
+                while True:
+                    now = time.time()
+                    # Print out statistics
+                    if generation > 0:
+                        best = max(population, key=Generator.fitness)
+                        print("Generation:", str(generation))
+                        print("Max fitness:", str(best.fitness()))
+                        if crowding:
+                            # crowding keeps everyone's fingerprint at hand
+                            unique, spread = diversity.stats(population)
+                            print("Distinct levels:", unique, "mean distance:", spread)
+                        else:
+                            print("Distinct levels:", diversity.distinct(population))
+                        print("Fitness cache: {} hits, {} misses ({:.0%} hit rate)".format(
+                            _fitness_cache.hits, _fitness_cache.misses, _fitness_cache.hit_rate()))
+                        print("Average generation time:", (now - start) / generation)
+                        print("Net time:", now - start)
+                        tiles.write_level("../levels/last.txt", best.to_level())
+                        # Generator.gen_tiles_level()
+                    generation += 1
+                    # STUDENT Determine stopping condition - creates a folder called levels and puts the gen levels in folder
+                    stop_condition = generations is not None and generation > generations
+                    if stop_condition:
+                        break
+                    # STUDENT Also consider using FI-2POP as in the Sorenson & Pasquier paper
+                    gentime = time.time()
+                    # Breed and evaluate the children in batches in parallel
+                    next_population = generate_successors(population, pool, batches, population_buffer,
+                                                          scheme=scheme, rng=rng, crowding=crowding)
+                    gendone = time.time()
+                    print("Generated and calculated successors in:", gendone - gentime, "seconds")
+                    population = next_population
+            except KeyboardInterrupt:
+                pass
+    finally:
+        if population_buffer is not None:
+            # the returned population outlives the buffer
+            for individual in population:
+                individual.detach()
+            population_buffer.close()
     return population
 
+def generate_level(budget_ms=5000, seed=None, min_fitness=None, stagnation=None,
+                   pop_limit=480, pool=None, scheme=selection.truncation, processes=None, crowding=False,
+                   level_paths=()):
+    # Anytime generation: run the GA and return the best individual found
+    # when the wall-clock budget runs out, the best fitness reaches
+    # min_fitness, or it has not improved for `stagnation` generations,
+    # whichever comes first.  The budget covers everything, including pool
+    # start-up when no warm pool is passed in.  A generation still breeding
+    # at the deadline is abandoned, after the few pool tasks already running
+    # finish (see map_until), so a warm pool is idle again on return.  The
+    # level files in level_paths are mixed into the first population.
+    # Raises multiprocessing.TimeoutError if not a single level was built in
+    # time.
+    deadline = time.monotonic() + budget_ms / 1000.0
+    rng = random.Random(seed)
+    if processes is None:
+        processes = os.cpu_count()
+    own_pool = pool is None
+    if own_pool:
+        pool = mpool.Pool(processes=processes, initializer=init_worker)
+    batches = processes
+    try:
+        population = initial_population(pool, pop_limit, batches, level_paths, deadline=deadline, rng=rng)
+        if not population:
+            raise mp.TimeoutError("no level was built within {} ms".format(budget_ms))
+        best = max(population, key=Generator.fitness)
+        stale = 0
+        while time.monotonic() < deadline:
+            try:
+                population = generate_successors(population, pool, batches, pop_limit=pop_limit,
+                                                 verbose=False, scheme=scheme, deadline=deadline, rng=rng,
+                                                 crowding=crowding)
+            except mp.TimeoutError:
+                break
+            generation_best = max(population, key=Generator.fitness)
+            if generation_best.fitness() > best.fitness():
+                best = generation_best
+                stale = 0
+            else:
+                stale += 1
+            if min_fitness is not None and best.fitness() >= min_fitness:
+                break
+            if stagnation is not None and stale >= stagnation:
+                break
+    finally:
+        if own_pool:
+            pool.terminate()
+    return best
+
 if __name__ == '__main__':
-    final_gen = sorted(dungeon(), key=Generator.fitness, reverse=True)
+    parser = argparse.ArgumentParser(description="Evolve a dungeon level; ctrl-c to stop.")
+    parser.add_argument("--shared-memory", action="store_true",
+                        help="keep the population's grids in one shared memory block")
+    parser.add_argument("--selection", choices=sorted(selection.SCHEMES),
+                        help="parent selection scheme (default: truncation, or tournament when pipelined)")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="asynchronous steady-state GA that keeps the pool saturated")
+    parser.add_argument("--in-flight", type=int,
+                        help="breeding tasks kept in flight when pipelined (default: 2 per CPU)")
+    parser.add_argument("--mix-levels", action="store_true",
+                        help="mix the levels in ../levels and game/level_*.txt into the initial population")
+    parser.add_argument("--budget-ms", type=int,
+                        help="stop after this many milliseconds and keep the best level so far")
+    parser.add_argument("--min-fitness", type=float,
+                        help="with --budget-ms, stop as soon as a level reaches this fitness")
+    parser.add_argument("--stagnation", type=int,
+                        help="with --budget-ms, stop after this many generations without improvement")
+    parser.add_argument("--islands", type=int, default=0,
+                        help="evolve this many sub-populations in separate processes")
+    parser.add_argument("--island-size", type=int, default=60)
+    parser.add_argument("--migration-interval", type=int, default=10,
+                        help="generations between migrations")
+    parser.add_argument("--migrants", type=int, default=4,
+                        help="individuals each island sends per migration")
+    parser.add_argument("--topology", choices=["ring", "random"], default="ring")
+    parser.add_argument("--crowding", action="store_true",
+                        help="children replace the most similar individual if fitter, not the weakest")
+    parser.add_argument("--seed", type=int,
+                        help="seed the run; the same seed evolves the same levels for any --workers")
+    parser.add_argument("--generations", type=int,
+                        help="stop after this many generations instead of waiting for ctrl-c")
+    parser.add_argument("--workers", type=int,
+                        help="pool processes (default: one per CPU)")
+    args = parser.parse_args()
+    if args.selection is None:
+        args.selection = "tournament" if args.pipelined else "truncation"
+    if args.pipelined:
+        # the pipelined driver has no generations, and no whole population
+        # for crowding or a shared buffer to work on
+        for option in ("shared_memory", "crowding", "generations"):
+            if getattr(args, option) not in (None, False):
+                parser.error("--{} cannot be used with --pipelined".format(option.replace("_", "-")))
+        # each pipelined task draws one pair from the whole population, and
+        # truncation would always hand it the same two best individuals
+        if args.selection == "truncation":
+            parser.error("--selection truncation cannot be used with --pipelined")
+    if args.budget_ms is not None:
+        # the anytime generator is one plain generational run against the
+        # clock; --generations would only fight the budget
+        for option in ("pipelined", "islands", "shared_memory", "generations"):
+            if getattr(args, option) not in (None, False, 0):
+                parser.error("--{} cannot be used with --budget-ms".format(option.replace("_", "-")))
+    if args.islands > 0:
+        # every island is a process of its own, with no pool or shared buffer
+        for option in ("shared_memory", "workers"):
+            if getattr(args, option) not in (None, False):
+                parser.error("--{} cannot be used with --islands".format(option.replace("_", "-")))
+    level_paths = []
+    if args.mix_levels:
+        for pattern in LEVEL_FILES:
+            level_paths += sorted(glob.glob(pattern))
+    if args.budget_ms is not None:
+        try:
+            population = [generate_level(args.budget_ms, args.seed, min_fitness=args.min_fitness,
+                                         stagnation=args.stagnation,
+                                         scheme=selection.SCHEMES[args.selection], processes=args.workers,
+                                         crowding=args.crowding, level_paths=level_paths)]
+        except mp.TimeoutError as error:
+            parser.exit(1, "{}\n".format(error))
+    elif args.pipelined:
+        import pipeline
+        population = pipeline.run_pipelined(in_flight=args.in_flight,
+                                            scheme=selection.SCHEMES[args.selection], seed=args.seed,
+                                            processes=args.workers, level_paths=level_paths)
+    elif args.islands > 0:
+        import islands
+        population = islands.run_islands(args.islands, args.island_size, args.migration_interval,
+                                         args.migrants, args.topology, selection.SCHEMES[args.selection],
+                                         seed=args.seed, crowding=args.crowding, level_paths=level_paths,
+                                         generations=args.generations)
+    else:
+        population = dungeon(shared_population=args.shared_memory,
+                             scheme=selection.SCHEMES[args.selection], level_paths=level_paths,
+                             seed=args.seed, generations=args.generations, processes=args.workers,
+                             crowding=args.crowding)
+    final_gen = sorted(population, key=lambda x: x.fitness(), reverse=True)
     best = final_gen[0]
     print("Best fitness: " + str(best.fitness()))
+    if (args.islands > 0 or args.budget_ms is not None) and best.to_level() is not None:
+        tiles.write_level("../levels/last.txt", best.to_level())
     now = time.strftime("%m_%d_%H_%M_%S")
     # STUDENT You can change this if you want to blast out the whole generation, or ten random samples, or...
     # for k in range(0, 10):
     #     with open("levels/" + now + "_" + str(k) + ".txt", 'w') as f:
-    #         for row in final_gen[k].to_level():
-    #             f.write("".join(row) + "\n")
+    #         for row in final_gen[k].to_text():
+    #             f.write(row + "\n")
 
 
@@ -0,0 +1,121 @@
+# islands.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+# Island-model GA: every process owns and evolves its own sub-population with
+# dungeon.generate_successors, and every few generations the islands trade
+# their best individuals over queues.  Islands never wait on each other:
+# at a migration point an island sends its best and takes in whatever has
+# arrived for it so far.
+#
+from __future__ import print_function
+import multiprocessing as mp
+import queue
+import random
+import signal
+import time
+import dungeon
+import selection
+from dungeon import Generator
+
+
+def island(index, island_size, interval, migrants, inboxes, destinations, results, stop, scheme,
+           seed, crowding, level_paths, generations):
+    # Ctrl-C belongs to the parent, which asks the islands to stop through
+    # the stop event.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # every island draws from its own stream, seeded by the parent
+    rng = random.Random(seed)
+
+    # the level files (those of the right size) start out on every island
+    population = []
+    for path in level_paths:
+        individual = Generator.from_level_file(path)
+        if individual.genome.shape == (dungeon.HEIGHT, dungeon.WIDTH) and len(population) < island_size:
+            population.append(individual)
+    population += [Generator.random_dungeon(rng.getrandbits(64)) for _g in range(island_size - len(population))]
+    generation = 0
+    while not stop.is_set() and (generations is None or generation < generations):
+        population = dungeon.generate_successors(population, pop_limit=island_size, verbose=False,
+                                                 scheme=scheme, rng=rng, crowding=crowding)
+        generation += 1
+        if generation % interval != 0:
+            continue
+
+        # migration point: send our best, take in whatever the neighbours
+        # have sent in place of our worst, keeping at least our own best
+        population.sort(key=lambda x: x.fitness(), reverse=True)
+        print("Island {} generation {} max fitness: {}".format(index, generation, population[0].fitness()))
+        outgoing = population[:migrants]
+        if destinations is None:
+            target = rng.choice([i for i in range(len(inboxes)) if i != index] or [index])
+        else:
+            target = destinations[index]
+        inboxes[target].put(outgoing)
+        incoming = []
+        while True:
+            try:
+                incoming += inboxes[index].get_nowait()
+            except queue.Empty:
+                break
+        incoming = incoming[:len(population) - migrants]
+        if incoming:
+            population[-len(incoming):] = incoming
+
+    # migrants nobody will read any more must not keep this process alive
+    for inbox in inboxes:
+        inbox.cancel_join_thread()
+    results.put(population)
+
+
+def run_islands(islands, island_size, interval=10, migrants=4, topology="ring",
+                scheme=selection.truncation, seed=None, crowding=False, level_paths=(), generations=None):
+    # Evolve `islands` sub-populations in separate processes until ctrl-c, or
+    # for `generations` generations, and return all of them as one
+    # population.  crowding and level_paths work as in dungeon.dungeon, on
+    # every island.
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _i in range(islands)]
+    inboxes = [mp.Queue() for _i in range(islands)]
+    if topology == "ring":
+        destinations = [(i + 1) % islands for i in range(islands)]
+    elif topology == "random":
+        destinations = None
+    else:
+        raise ValueError("unknown migration topology: {}".format(topology))
+    results = mp.Queue()
+    stop = mp.Event()
+    processes = [mp.Process(target=island,
+                            args=(i, island_size, interval, migrants, inboxes, destinations, results, stop,
+                                  scheme, seeds[i], crowding, list(level_paths), generations))
+                 for i in range(islands)]
+    start = time.time()
+    for process in processes:
+        process.start()
+    print("Use ctrl-c to terminate the islands.")
+    # An island cannot exit until its population has been read off the
+    # queue, so read while waiting rather than after
+    population = []
+    pending = islands
+    try:
+        while pending and any(process.is_alive() for process in processes):
+            try:
+                population += results.get(timeout=0.5)
+                pending -= 1
+            except queue.Empty:
+                pass
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    while pending:
+        try:
+            population += results.get(timeout=0.5)
+            pending -= 1
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                print(pending, "island(s) ended without sending their population")
+                break
+    for process in processes:
+        process.join()
+    print("Islands ran for:", time.time() - start, "seconds")
+    return population
@@ -0,0 +1,107 @@
+# metrics/__init__.py
+#
+# By: Ismael Cortez, Nelson Norman
+# Adapted from: A simple python dungeon generator by James Spencer
+#
+import numpy as np
+import tiles
+from metrics import distance
+from metrics import solvability
+
+
+CODES = tiles.TILE_CODES
+# tiles that count as open floor, i.e. everything walkable but the player
+# and weapons
+FLOOR_CODES = [CODES[name] for name in
+               ('floor', 'enemy', 'item', 'ranged', 'trap', 'boss', 'door', 'key')]
+
+
+def reachable(grids, parts=None):
+    # (walkable, reached) masks for a stack: the walkable tiles, and those
+    # connected to a player tile.  parts is distance.components(grids), if
+    # the caller already has it.
+    if parts is None:
+        parts = distance.components(grids)
+    return parts.walkable, parts.connected_to(grids == CODES['player'])
+
+
+def census(grids):
+    # (N, tile codes) counts for a stack of grids, in one bincount: each
+    # level's codes are offset into a range of their own
+    n = len(grids)
+    offsets = np.arange(n)[:, None] * len(CODES)
+    flat = grids.reshape(n, -1) + offsets
+    return np.bincount(flat.ravel(), minlength=n * len(CODES)).reshape(n, len(CODES))
+
+
+def batch_metrics(grids, room_counts, paths=False):
+    # Metrics for a whole (N, H, W) stack of tile-code grids, as one array
+    # per metric (row i belongs to grids[i]).  room_counts holds the number
+    # of rooms in each level.  The path metrics (distance.PATH_METRICS) take
+    # two BFS runs over the stack and are only added when paths is set.
+    n, maxY, maxX = grids.shape
+    rooms = np.asarray(room_counts)
+
+    totalSize = maxX * maxY
+    counts = census(grids)
+    floor = counts[:, FLOOR_CODES].sum(axis=1)
+    enemies = counts[:, CODES['enemy']] + counts[:, CODES['ranged']]
+    key = counts[:, CODES['key']]
+    boss = counts[:, CODES['boss']]
+    item = counts[:, CODES['item']]
+    trap = counts[:, CODES['trap']]
+    player = counts[:, CODES['player']]
+
+    # share of the walkable tiles the player can get to, and whether the key
+    # and the boss are among them; one labelling of the stack, with doors
+    # cut out, serves reachability, solvability and the path metrics
+    parts = distance.components(grids, solvability.GATE_CODES)
+    walkable, reach = reachable(grids, parts)
+    open_tiles = walkable.sum(axis=(1, 2))
+    freeSpace = np.where(open_tiles > 0, reach.sum(axis=(1, 2)) / np.maximum(open_tiles, 1), 0.0)
+    keyReachable = (reach & (grids == CODES['key'])).any(axis=(1, 2))
+    bossReachable = (reach & (grids == CODES['boss'])).any(axis=(1, 2))
+    # whether the boss can be reached with the doors shut until the key is
+    # picked up (see solvability.py)
+    solvable = solvability.solvable(grids, parts)
+    if totalSize != 0:
+        freePercentage = floor / float(totalSize)
+        decorationPercentage = (item + trap + enemies) / float(totalSize)
+    else:
+        freePercentage = np.zeros(n)
+        decorationPercentage = np.zeros(n)
+    leniency = enemies + trap * 0.5 - item * 0.5
+    legalPieces = np.select([(player > 1) | (boss > 1) | (key > 1),
+                             (player == 1) & (boss == 1) & (key == 1),
+                             (player == 1) | (boss == 1) | (key == 1)],
+                            [-5, 10, 5], 0)
+    roomCount = np.where(rooms > 5, rooms / 15, 0)
+
+    columns = {
+            'length': np.full(n, maxX),
+            'freeSpace': freeSpace,
+            'keyReachable': keyReachable,
+            'bossReachable': bossReachable,
+            'solvable': solvable,
+            'freePercentage': freePercentage,
+            'decorationPercentage': decorationPercentage,
+            'leniency': leniency,
+            'legalPieces': legalPieces,
+            'roomCount': roomCount
+            }
+    if paths:
+        # path lengths between spawn, key, boss and weapons (see distance.py)
+        columns.update(distance.path_metrics(grids, parts))
+    return columns
+
+
+def metrics(levelStr, roomList=(), paths=False):
+    # One level's metrics as plain numbers, with the path metrics if paths
+    # is set.  Genomes arrive as uint8 tile-code grids (see tiles.py); text
+    # levels are converted to one first.
+    if isinstance(levelStr, np.ndarray):
+        grid = levelStr
+    else:
+        grid = tiles.to_grid(levelStr)
+    columns = batch_metrics(grid[None], [len(roomList)], paths)
+    return {name: column[0].item() for name, column in columns.items()}
@@ -0,0 +1,14 @@
+# metrics/__main__.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+# cd src && python -m metrics game/*.txt
+#
+import sys
+from metrics import metrics
+
+for name in sys.argv[1:]:
+    with open(name, 'r') as openFile:
+        lines = openFile.readlines()
+    print(name, len(lines), len(lines[0]))
+    print(metrics(lines, paths=True))
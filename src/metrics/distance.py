@@ -0,0 +1,184 @@
+# distance.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+# Breadth-first distance fields over the walkable tiles of a whole stack of
+# levels at once.  The walkable mask and the BFS frontier of every level in
+# the stack are packed into one bitboard (a Python int, one bit per tile), so
+# a BFS step for the whole stack is four shifts, an OR and an AND rather than
+# a loop over tiles.  One BFS from a source answers every distance query from
+# it.
+#
+import numpy as np
+import tiles
+from scipy import ndimage
+from scipy.sparse import coo_matrix, csgraph
+
+CODES = tiles.TILE_CODES
+# tiles you cannot walk through
+BLOCKING_CODES = [CODES['stone'], CODES['wall']]
+# points of interest the fields are measured from
+SOURCES = ('player', 'key', 'boss', 'weapon')
+# the metrics path_metrics adds
+PATH_METRICS = ('pathToKey', 'keyToBoss', 'weaponDistance', 'detourRatio')
+UNREACHED = -1
+# 4-connected steps within a level, never from one level of a stack to the
+# next
+STEPS = np.zeros((3, 3, 3), dtype=bool)
+STEPS[1] = [[False, True, False], [True, True, True], [False, True, False]]
+
+
+# The walkable tiles of a stack cut into labelled nodes, once, for every
+# metric that needs to know what connects to what.  Tiles whose codes are
+# cut (doors, see solvability.py) are taken out of the walkable area and
+# each run of them becomes a node of its own, so nodes are the pieces of
+# open floor and the runs of cut tiles.  Every node in the stack gets a
+# label of its own.  joined maps each node to the connected component it
+# lies in once cut tiles are walked through like any other.
+class Components(object):
+    __slots__ = ["walkable", "labels", "count", "pairs", "joined"]
+
+    def __init__(self, grids, cut=()):
+        self.walkable = ~np.isin(grids, BLOCKING_CODES)
+        self.labels, self.count = ndimage.label(self.walkable & ~np.isin(grids, cut), structure=STEPS)
+        for code in cut:
+            runs, found = ndimage.label(grids == code, structure=STEPS)
+            run_tiles = np.nonzero(runs)
+            self.labels[run_tiles] = runs[run_tiles] + self.count
+            self.count += found
+        self.pairs = node_pairs(self.labels, self.count)
+        if len(self.pairs):
+            graph = coo_matrix((np.ones(len(self.pairs)), (self.pairs[:, 0], self.pairs[:, 1])),
+                               shape=(self.count + 1, self.count + 1))
+            _found, self.joined = csgraph.connected_components(graph, directed=False)
+        else:
+            self.joined = np.arange(self.count + 1)
+
+    def connected_to(self, sources):
+        # mask of the tiles in the same component as some source tile
+        touched = np.zeros(self.count + 1, dtype=bool)
+        touched[self.joined[self.labels[sources]]] = True
+        touched[self.joined[0]] = False
+        # component flags read per node, then per tile
+        return touched[self.joined][self.labels]
+
+
+def components(grids, cut=()):
+    return Components(grids, cut)
+
+
+def node_pairs(labels, count):
+    # (P, 2) array of the distinct pairs of nodes with 4-adjacent tiles, each
+    # pair once.  Pairs are packed into one int so a flat unique drops the
+    # repeats.
+    packed = []
+    for a, b in ((labels[:, :, :-1], labels[:, :, 1:]), (labels[:, :-1, :], labels[:, 1:, :])):
+        touching = (a != b) & (a > 0) & (b > 0)
+        low = np.minimum(a[touching], b[touching]).astype(np.int64)
+        high = np.maximum(a[touching], b[touching])
+        packed.append(low * (count + 1) + high)
+    packed = np.unique(np.concatenate(packed))
+    return np.stack([packed // (count + 1), packed % (count + 1)], axis=1)
+
+
+# Bit layout: bit i is the flat index into an (N, H + 1, W + 1) array, every
+# level followed by a clear row and every row by a clear column, so shifting
+# by one column or one row can never wrap onto a walkable tile.
+
+def pack(mask):
+    # (N, H, W) bool -> bitboard
+    n, h, w = mask.shape
+    padded = np.zeros((n, h + 1, w + 1), dtype=bool)
+    padded[:, :h, :w] = mask
+    return int.from_bytes(np.packbits(padded.ravel(), bitorder='little').tobytes(), 'little')
+
+
+def unpack(bits, shape):
+    # bitboard -> (N, H, W) bool
+    n, h, w = shape
+    size = n * (h + 1) * (w + 1)
+    raw = np.frombuffer(bits.to_bytes((size + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder='little')[:size].reshape(n, h + 1, w + 1)[:, :h, :w].astype(bool)
+
+
+def expand(walkable, sources, shape, targets=(), field=False):
+    # BFS over the walkable bits from the source bits of a stack of the
+    # given shape.  Returns, for each target bitboard, an (N,) array of the
+    # steps to each level's nearest target tile (UNREACHED if there is
+    # none), plus the (N, H, W) distance field if asked for.
+    n, h, w = shape
+    stride = w + 1
+    level_bits = (h + 1) * stride
+    level_mask = (1 << level_bits) - 1
+    hits = [np.full(n, UNREACHED) for _t in targets]
+    pending = list(targets)
+    dist = np.full(shape, UNREACHED, dtype=np.int32) if field else None
+
+    frontier = sources & walkable
+    unvisited = walkable & ~frontier
+    remaining = 0
+    for target in pending:
+        remaining |= target
+    distance = 0
+    while frontier:
+        if frontier & remaining:
+            for hit, i in zip(hits, range(len(pending))):
+                found = frontier & pending[i]
+                while found:
+                    # the level of the lowest reached target, which is done
+                    level = ((found & -found).bit_length() - 1) // level_bits
+                    hit[level] = distance
+                    done = ~(level_mask << (level * level_bits))
+                    found &= done
+                    pending[i] &= done
+            remaining = 0
+            for target in pending:
+                remaining |= target
+        if not (field or remaining):
+            # every target that can be reached has been
+            break
+        if field:
+            dist[unpack(frontier, shape)] = distance
+        distance += 1
+        frontier = ((frontier << 1) | (frontier >> 1) | (frontier << stride) | (frontier >> stride)) & unvisited
+        unvisited ^= frontier
+    return hits, dist
+
+
+def distance_fields(grids):
+    # {source name: (N, H, W) int32 steps to the nearest such tile, or
+    # UNREACHED}, for every source in SOURCES
+    walkable = pack(~np.isin(grids, BLOCKING_CODES))
+    return {name: expand(walkable, pack(grids == CODES[name]), grids.shape, field=True)[1]
+            for name in SOURCES}
+
+
+def path_metrics(grids, parts=None):
+    # Path lengths between the points of interest, one array per metric:
+    # spawn to key, key to boss, spawn to the nearest weapon, and the detour
+    # ratio (spawn -> key -> boss over spawn -> boss, 0 if either way is
+    # cut).  Two BFS runs, from the player and from the key, cover them all.
+    # Targets outside the source's component are dropped up front, so each
+    # BFS stops as soon as the last reachable target is found.  parts is
+    # components(grids), if the caller already has it.
+    if parts is None:
+        parts = components(grids)
+    player = grids == CODES['player']
+    key = grids == CODES['key']
+    boss = grids == CODES['boss']
+    weapon = grids == CODES['weapon']
+    from_player = parts.connected_to(player)
+    from_key = parts.connected_to(key)
+    walkable = pack(parts.walkable)
+    (pathToKey, pathToBoss, weaponDistance), _dist = expand(
+        walkable, pack(player), grids.shape,
+        (pack(key & from_player), pack(boss & from_player), pack(weapon & from_player)))
+    (keyToBoss,), _dist = expand(walkable, pack(key), grids.shape, (pack(boss & from_key),))
+    connected = (pathToKey >= 0) & (keyToBoss >= 0) & (pathToBoss > 0)
+    detourRatio = np.where(connected, (pathToKey + keyToBoss) / np.maximum(pathToBoss, 1), 0.0)
+    return {
+            'pathToKey': pathToKey,
+            'keyToBoss': keyToBoss,
+            'weaponDistance': weaponDistance,
+            'detourRatio': detourRatio
+            }
@@ -0,0 +1,84 @@
+# solvability.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+# Can the player get from the spawn to the boss?  Doors only let the player
+# through once the key has been picked up (collide_with_door in
+# game/sprites.py), so a level is beatable only if the key can be reached
+# without going through a door.
+#
+# The search runs over (node, inventory) states rather than over tiles.  The
+# nodes are those of distance.components with the gate tiles cut out: the
+# connected pieces of open floor, and the connected runs of each kind of
+# gate tile.  The same labelling serves the other metrics.  An inventory is
+# a bitmask with bit i set once the key of GATES[i] is held.  A node can be
+# entered when the inventory holds the key its gate asks for, and entering
+# a node picks up every key lying in it.
+# Each node is visited at most once per inventory it is reached with, so
+# the search costs the number of nodes, not tiles.
+#
+import collections
+import numpy as np
+import tiles
+from metrics import distance
+
+CODES = tiles.TILE_CODES
+# (gate tile, the key that opens it); a new kind of locked tile is one more
+# entry here
+GATES = (('door', 'key'),)
+GATE_CODES = [CODES[gate] for gate, _key in GATES]
+KEY_CODES = [CODES[key] for _gate, key in GATES]
+
+
+def node_masks(labels, count, grids, codes):
+    # (count + 1,) int array with bit i set for the nodes holding a tile of
+    # codes[i]
+    masks = np.zeros(count + 1, dtype=np.int64)
+    for bit, code in enumerate(codes):
+        np.bitwise_or.at(masks, labels[grids == code], 1 << bit)
+    masks[0] = 0
+    return masks
+
+
+def edges(pairs):
+    # node -> neighbouring nodes, from distance.node_pairs
+    result = collections.defaultdict(list)
+    for a, b in pairs.tolist():
+        result[a].append(b)
+        result[b].append(a)
+    return result
+
+
+def search(starts, neighbours, needs, keys):
+    # Breadth-first search over (node, inventory) states from the start
+    # nodes with nothing in hand.  Returns every node reached.
+    seen = set((node, keys[node]) for node in starts)
+    queue = collections.deque(seen)
+    while queue:
+        node, held = queue.popleft()
+        for other in neighbours[node]:
+            if needs[other] & ~held:
+                # locked, and we do not have its key yet
+                continue
+            state = (other, held | keys[other])
+            if state not in seen:
+                seen.add(state)
+                queue.append(state)
+    return set(node for node, _held in seen)
+
+
+def solvable(grids, parts=None):
+    # (N,) bool: whether some boss tile of each level can be reached from a
+    # player tile, picking up keys on the way.  parts is
+    # distance.components(grids, GATE_CODES), if the caller already has it.
+    if parts is None:
+        parts = distance.components(grids, GATE_CODES)
+    labels, count = parts.labels, parts.count
+    keys = node_masks(labels, count, grids, KEY_CODES).tolist()
+    needs = node_masks(labels, count, grids, GATE_CODES).tolist()
+    reached = np.zeros(count + 1, dtype=bool)
+    reached[list(search(np.unique(labels[grids == CODES['player']]).tolist(), edges(parts.pairs),
+                        needs, keys))] = True
+    reached[0] = False
+    return (reached[labels] & (grids == CODES['boss'])).any(axis=(1, 2))
+
@@ -0,0 +1,95 @@
+# pipeline.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+# Asynchronous steady-state driver.  Instead of evaluating a whole generation
+# and then breeding the next one, the parent keeps a window of breeding tasks
+# in flight.  Every time a child comes back it is inserted into the
+# population (the weakest individual goes once the population is full) and
+# a new pair of parents is submitted straight away, so the pool never waits
+# on stragglers or on the parent.  Children repeating a level already in the
+# population are thrown away.
+#
+from __future__ import print_function
+import collections
+import math
+import multiprocessing.pool as mpool
+import os
+import queue
+import random
+import time
+import dungeon
+import selection
+import tiles
+
+
+def run_pipelined(pop_limit=480, in_flight=None, scheme=selection.tournament, seed=None,
+                  processes=None, level_paths=()):
+    # Pairs are drawn one at a time with scheme(fitnesses, 1, rng), so use
+    # a scheme that makes sense for a single draw (tournament or rank).
+    # level_paths are mixed into the initial population as in
+    # dungeon.dungeon.
+    # Seeding fixes the initial population and every child's own stream, but
+    # which child lands in which slot still depends on arrival order.
+    rng = random.Random(seed)
+    if processes is None:
+        processes = os.cpu_count()
+    if in_flight is None:
+        in_flight = 2 * processes
+    population = []
+    fitnesses = []
+    # level_hash -> copies in the population
+    levels = collections.Counter()
+    # children (or errors) arrive here from the pool's result thread
+    arrivals = queue.Queue()
+
+    def submit(pool):
+        i, j = scheme(fitnesses, 1, rng)[0]
+        pool.apply_async(dungeon.breed, ((population[i].room_list, population[j].room_list,
+                                          rng.getrandbits(64)),),
+                         callback=arrivals.put, error_callback=arrivals.put)
+
+    # report about once per generation's worth of children
+    report_every = max(1, int(math.ceil(pop_limit * 0.25)))
+    children = 0
+    start = time.time()
+    with mpool.Pool(processes=processes, initializer=dungeon.init_worker) as pool:
+        population += dungeon.initial_population(pool, pop_limit, processes, level_paths, rng=rng)
+        fitnesses += [x.fitness() for x in population]
+        levels.update(x.level_hash for x in population)
+        for _k in range(in_flight):
+            submit(pool)
+        print("Use ctrl-c to terminate this loop manually.")
+        try:
+            while True:
+                child = arrivals.get()
+                if isinstance(child, BaseException):
+                    raise child
+                if levels[child.level_hash] > 0:
+                    # a copy of a level we already have
+                    submit(pool)
+                    continue
+                levels[child.level_hash] += 1
+                if len(population) >= pop_limit:
+                    # swap the weakest out for the child
+                    worst = selection.weakest(fitnesses, 1)[0]
+                    levels[population[worst].level_hash] -= 1
+                    population[worst] = child
+                    fitnesses[worst] = child.fitness()
+                else:
+                    population.append(child)
+                    fitnesses.append(child.fitness())
+                children += 1
+                submit(pool)
+
+                if children % report_every == 0:
+                    now = time.time()
+                    best = population[selection.strongest(fitnesses, 1)[0]]
+                    print("Children:", children)
+                    print("Max fitness:", str(best.fitness()))
+                    print("Children per second:", children / (now - start))
+                    if best.to_level() is not None:
+                        tiles.write_level("../levels/last.txt", best.to_level())
+        except KeyboardInterrupt:
+            pass
+    return population
@@ -0,0 +1,47 @@
+# raster.py
+#
+# By: Ismael Cortez, Nelson Norman
+# Adapted from: A simple python dungeon generator by James Spencer
+#
+import numpy as np
+from scipy import ndimage
+from tiles import TILE_CODES
+
+CODES = TILE_CODES
+# 3x3 neighbourhood used to grow walls around floor
+WALL_STRUCTURE = np.ones((3, 3), dtype=bool)
+
+
+def stamp_rooms(grid, room_list, code=CODES['floor']):
+    # one slice assignment per room rectangle
+    for room in room_list:
+        x, y, w, h = room.rect
+        grid[y:y + h, x:x + w] = code
+
+
+def stamp_corridors(grid, corridor_list, code=CODES['floor']):
+    # a corridor is two or three points; each consecutive pair is a straight
+    # (or single-cell) segment
+    for corridor in corridor_list:
+        for (x1, y1), (x2, y2) in zip(corridor, corridor[1:]):
+            grid[min(y1, y2):max(y1, y2) + 1, min(x1, x2):max(x1, x2) + 1] = code
+
+
+def paint_walls(grid):
+    # every stone tile touching an interior floor tile, diagonals included,
+    # becomes wall
+    floor = np.zeros(grid.shape, dtype=bool)
+    floor[1:-1, 1:-1] = grid[1:-1, 1:-1] == CODES['floor']
+    touching = ndimage.binary_dilation(floor, structure=WALL_STRUCTURE)
+    grid[touching & (grid == CODES['stone'])] = CODES['wall']
+
+
+def rasterize(room_list, corridor_list, height, width):
+    # all-stone grid with every room and corridor painted as floor and walls
+    # grown around them
+    grid = np.full((height, width), CODES['stone'], dtype=np.uint8)
+    stamp_rooms(grid, room_list)
+    stamp_corridors(grid, corridor_list)
+    paint_walls(grid)
+    return grid
+
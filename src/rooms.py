@@ -0,0 +1,68 @@
+# rooms.py
+#
+# By: Ismael Cortez, Nelson Norman
+# Adapted from: A simple python dungeon generator by James Spencer
+#
+from collections import namedtuple
+import numpy as np
+from scipy import ndimage
+from tiles import CHARACTER_TILES, TILE_CODES, CODE_CHARACTERS
+
+
+# A room rectangle (x, y, w, h) plus the one special tile placed inside it at
+# (xx, yy).  Rooms are immutable, so parents and children share them freely.
+class Room(namedtuple("Room", ["x", "y", "w", "h", "xx", "yy", "tile"])):
+    __slots__ = ()
+
+    @property
+    def rect(self):
+        return (self.x, self.y, self.w, self.h)
+
+
+# Occupancy bitmap kept alongside a room list (see Generator.add_room and
+# remove_room).  Each cell counts the rooms covering it, so rooms can be
+# removed as well as added, and a collision test is a single slice any().
+class RoomIndex(object):
+    __slots__ = ["occupancy"]
+
+    def __init__(self, room_list, height, width):
+        self.occupancy = np.zeros((height, width), dtype=np.uint16)
+        for room in room_list:
+            self.add(room)
+
+    def add(self, room):
+        self.occupancy[room.y:room.y + room.h, room.x:room.x + room.w] += 1
+
+    def remove(self, room):
+        self.occupancy[room.y:room.y + room.h, room.x:room.x + room.w] -= 1
+
+    def overlaps(self, room):
+        # the candidate plus a one-tile margin on its right and bottom edges,
+        # matching the rectangle test used before the index existed
+        return bool(self.occupancy[room.y:room.y + room.h + 1, room.x:room.x + room.w + 1].any())
+
+
+def rooms_from_grid(grid):
+    # Recover a room list from a painted level.  Opening the walkable mask
+    # with a 3x3 square erases the one-tile corridors and leaves the rooms;
+    # each remaining component's bounding box is a room, and its special
+    # tile is the first player/boss/item/enemy/trap/key tile inside it.
+    walkable = (grid != TILE_CODES['stone']) & (grid != TILE_CODES['wall'])
+    opened = ndimage.binary_opening(walkable, structure=np.ones((3, 3), dtype=bool))
+    labels, count = ndimage.label(opened)
+    specials = [TILE_CODES[name] for name in ('player', 'boss', 'item', 'enemy', 'ranged', 'key', 'trap')]
+    room_list = []
+    for box in ndimage.find_objects(labels):
+        rows, cols = box
+        inside = grid[box]
+        special = np.argwhere(np.isin(inside, specials))
+        if len(special):
+            yy, xx = special[0]
+            tile = CODE_CHARACTERS[inside[yy, xx]]
+        else:
+            yy, xx = 0, 0
+            tile = CHARACTER_TILES['floor']
+        room_list.append(Room(int(cols.start), int(rows.start),
+                              int(cols.stop - cols.start), int(rows.stop - rows.start),
+                              int(cols.start + xx), int(rows.start + yy), str(tile)))
+    return room_list
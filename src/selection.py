@@ -0,0 +1,67 @@
+# selection.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+# Selection primitives for generate_successors.  Everything works on a list
+# of fitness values and hands back indices into it, using partial selection
+# (heapq) rather than sorting the whole population.  Ties always resolve to
+# the earlier index, so with a seeded rng the result is reproducible.
+#
+# A parent selection scheme is a function (fitnesses, count, rng) -> list of
+# `count` (parent, other parent) index pairs.
+#
+import heapq
+import random
+
+
+def strongest(fitnesses, count):
+    # indices of the `count` fittest, best first
+    return heapq.nlargest(count, range(len(fitnesses)), key=fitnesses.__getitem__)
+
+
+def weakest(fitnesses, count):
+    # indices of the `count` least fit, worst first
+    return heapq.nsmallest(count, range(len(fitnesses)), key=fitnesses.__getitem__)
+
+
+def truncation(fitnesses, count, rng=random):
+    # The original steady state scheme: each of the top `count` individuals
+    # breeds with a random partner from the top `count`.
+    top = strongest(fitnesses, count)
+    return [(i, rng.choice(top)) for i in top]
+
+
+def tournament(fitnesses, count, rng=random, size=2):
+    # Each parent is the fittest of `size` individuals drawn at random.
+    def winner():
+        best = rng.randrange(len(fitnesses))
+        for _k in range(size - 1):
+            challenger = rng.randrange(len(fitnesses))
+            if fitnesses[challenger] > fitnesses[best]:
+                best = challenger
+        return best
+    return [(winner(), winner()) for _i in range(count)]
+
+
+def rank(fitnesses, count, rng=random, pressure=1.5):
+    # Linear ranking selection with selective pressure in [1, 2] without
+    # computing ranks: with probability pressure - 1 take the better of two
+    # uniform draws (which is rank-proportional), otherwise a uniform draw.
+    # The mixture gives each rank the linear-ranking probability up to an
+    # O(1/n) term, in O(1) per parent.
+    def pick():
+        first = rng.randrange(len(fitnesses))
+        if rng.random() >= pressure - 1:
+            return first
+        second = rng.randrange(len(fitnesses))
+        if fitnesses[second] > fitnesses[first]:
+            return second
+        return first
+    return [(pick(), pick()) for _i in range(count)]
+
+
+SCHEMES = {
+    "truncation": truncation,
+    "tournament": tournament,
+    "rank": rank,
+}
@@ -0,0 +1,166 @@
+# service.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+# Long-running level service.  A background thread keeps a warm worker pool
+# busy evolving levels with dungeon.generate_level and stores finished ones
+# in a bounded ready-queue; HTTP requests on localhost just take a level off
+# that queue.
+#
+#   python service.py --port 8765 --ready 16 --budget-ms 3000
+#   curl http://127.0.0.1:8765/level     -> one level as text
+#   curl http://127.0.0.1:8765/status    -> queue, production and error counters
+#
+from __future__ import print_function
+import argparse
+import json
+import multiprocessing as mp
+import multiprocessing.pool as mpool
+import os
+import queue
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import dungeon
+
+
+class LevelService(object):
+    __slots__ = ["ready", "budget_ms", "min_fitness", "stagnation", "pool", "stop",
+                 "producer", "produced", "rejected", "errors", "last_error", "served"]
+
+    def __init__(self, ready=16, budget_ms=3000, min_fitness=None, stagnation=None):
+        self.ready = queue.Queue(maxsize=ready)
+        self.budget_ms = budget_ms
+        self.min_fitness = min_fitness
+        self.stagnation = stagnation
+        self.pool = mpool.Pool(processes=os.cpu_count(), initializer=dungeon.init_worker)
+        self.stop = threading.Event()
+        self.producer = threading.Thread(target=self.produce, daemon=True)
+        self.produced = 0
+        self.rejected = 0
+        self.errors = 0
+        self.last_error = None
+        self.served = 0
+
+    def start(self):
+        self.producer.start()
+
+    def produce(self):
+        # Refill the ready-queue whenever there is room in it.  Only levels
+        # that scored above zero, and reached min_fitness if one is set,
+        # are queued.  A failed run is logged and counted, and the producer
+    # carries on after a short pause rather than dying silently.
+        while not self.stop.is_set():
+            try:
+                best = dungeon.generate_level(self.budget_ms, min_fitness=self.min_fitness,
+                                              stagnation=self.stagnation, pool=self.pool)
+            except mp.TimeoutError:
+                # nothing was built within the budget
+                self.rejected += 1
+                continue
+            except Exception as error:
+                if self.stop.is_set():
+                    break
+                traceback.print_exc()
+                self.errors += 1
+                self.last_error = "{}: {}".format(type(error).__name__, error)
+                self.stop.wait(1.0)
+                continue
+            if best.fitness() <= 0 or (self.min_fitness is not None and best.fitness() < self.min_fitness):
+                self.rejected += 1
+                continue
+            level = "".join(row + "\n" for row in best.to_text())
+            while not self.stop.is_set():
+                try:
+                    self.ready.put((best.fitness(), level), timeout=0.5)
+                    self.produced += 1
+                    break
+                except queue.Full:
+                    continue
+
+    def take(self, timeout):
+        # (fitness, level text) of a finished level, or None if none shows
+        # up within timeout seconds
+        try:
+            entry = self.ready.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self.served += 1
+        return entry
+
+    def status(self):
+        return {"ready": self.ready.qsize(),
+                "capacity": self.ready.maxsize,
+                "produced": self.produced,
+                "rejected": self.rejected,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "producing": self.producer.is_alive(),
+                "served": self.served}
+
+    def close(self):
+        # let the producer finish the level in hand before the pool goes,
+        # or its pool calls fail on the terminated pool
+        self.stop.set()
+        if self.producer.is_alive():
+            self.producer.join(self.budget_ms / 1000.0 + 5.0)
+        self.pool.terminate()
+
+
+class LevelHandler(BaseHTTPRequestHandler):
+    # the LevelService, set by serve()
+    service = None
+    # how long a request may wait when the ready-queue is empty
+    wait = 30.0
+
+    def do_GET(self):
+        if self.path == "/level":
+            entry = self.service.take(self.wait)
+            if entry is None:
+                self.reply(503, "text/plain", "no level ready\n")
+                return
+            fitness, level = entry
+            self.reply(200, "text/plain", level, {"X-Fitness": str(fitness)})
+        elif self.path == "/status":
+            self.reply(200, "application/json", json.dumps(self.service.status()) + "\n")
+        else:
+            self.reply(404, "text/plain", "unknown path\n")
+
+    def reply(self, code, content_type, body, headers=None):
+        data = body.encode("ascii")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8765, ready=16, budget_ms=3000, min_fitness=None, stagnation=None):
+    service = LevelService(ready, budget_ms, min_fitness, stagnation)
+    LevelHandler.service = service
+    server = ThreadingHTTPServer(("127.0.0.1", port), LevelHandler)
+    service.start()
+    print("Serving levels on http://127.0.0.1:{}/level (ctrl-c to stop)".format(port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve pre-generated dungeon levels over local HTTP.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ready", type=int, default=16, help="finished levels to keep queued")
+    parser.add_argument("--budget-ms", type=int, default=3000, help="time spent evolving each level")
+    parser.add_argument("--min-fitness", type=float)
+    parser.add_argument("--stagnation", type=int)
+    args = parser.parse_args()
+    serve(args.port, args.ready, args.budget_ms, args.min_fitness, args.stagnation)
@@ -0,0 +1,56 @@
+# shared.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+from multiprocessing import shared_memory
+import numpy as np
+
+# The buffer as seen from a pool worker, set once by attach().
+_worker_grids = None
+_worker_block = None
+
+
+# Every individual's grid lives in one shared memory block shaped
+# (slots, height, width).  Individuals hold a slot index and a view into the
+# block, so neither the parent nor the workers pickle grids in the hot loop.
+class SharedPopulation(object):
+    __slots__ = ["block", "grids", "free"]
+
+    def __init__(self, slots, height, width):
+        self.block = shared_memory.SharedMemory(create=True, size=slots * height * width)
+        self.grids = np.ndarray((slots, height, width), dtype=np.uint8, buffer=self.block.buf)
+        self.free = list(range(slots - 1, -1, -1))
+
+    def initargs(self):
+        # arguments for attach() as a pool initializer
+        return (self.block.name, self.grids.shape)
+
+    def allocate(self):
+        if not self.free:
+            raise MemoryError("no free slots left in the shared population")
+        return self.free.pop()
+
+    def release(self, slot):
+        self.free.append(slot)
+
+    def close(self):
+        # Free the block.  Views handed out by grids must be dropped (or
+        # copied out) first; if any survive, the mapping stays until exit but
+        # the block is still unlinked.
+        self.grids = None
+        try:
+            self.block.close()
+        except BufferError:
+            pass
+        self.block.unlink()
+
+
+def attach(name, shape):
+    # Pool initializer: map the parent's block once per worker.
+    global _worker_grids, _worker_block
+    _worker_block = shared_memory.SharedMemory(name=name)
+    _worker_grids = np.ndarray(shape, dtype=np.uint8, buffer=_worker_block.buf)
+
+
+def worker_grids():
+    return _worker_grids
@@ -0,0 +1,60 @@
+# tiles.py
+#
+# By: Ismael Cortez, Nelson Norman
+# Adapted from: A simple python dungeon generator by James Spencer
+#
+import numpy as np
+
+CHARACTER_TILES = {'stone': '*',
+                   'floor': '.',
+                   'wall': '#',
+                   'boss': 'B',
+                   'item': 'M',
+                   'enemy': 'E',
+                   'ranged': 'R',
+                   'trap': 'T',
+                   'door': '/',
+                   'key': 'K',
+                   'player': 'P',
+                   'weapon': 'W'
+                   }
+
+# Fixed uint8 code for every tile, numbered in CHARACTER_TILES order.  Stone
+# is code 0, so a zeroed grid is a level of solid rock.
+TILE_CODES = {name: code for code, name in enumerate(CHARACTER_TILES)}
+CHARACTER_CODES = {CHARACTER_TILES[name]: code for name, code in TILE_CODES.items()}
+CODE_CHARACTERS = np.array([CHARACTER_TILES[name] for name in CHARACTER_TILES])
+
+# byte -> tile code.  Characters outside the table (hand-edited markers such
+# as '$' in src/game/level_a.txt) read as floor, which is how the game treats
+# them.
+_DECODE_BYTES = np.full(256, TILE_CODES['floor'], dtype=np.uint8)
+for _char, _code in CHARACTER_CODES.items():
+    _DECODE_BYTES[ord(_char)] = _code
+_ENCODE_BYTES = np.array([ord(c) for c in CODE_CHARACTERS], dtype=np.uint8)
+
+
+def to_grid(lines):
+    # list of strings (or lists of one-char strings) -> 2-D uint8 code grid
+    rows = ["".join(row).rstrip("\r\n") for row in lines]
+    rows = [row for row in rows if row]
+    width = len(rows[0])
+    raw = np.frombuffer("".join(rows).encode("ascii"), dtype=np.uint8)
+    return _DECODE_BYTES[raw].reshape(len(rows), width)
+
+
+def to_lines(grid):
+    # 2-D uint8 code grid -> list of strings, one per row
+    raw = _ENCODE_BYTES[grid]
+    return [row.tobytes().decode("ascii") for row in raw]
+
+
+def read_level(path):
+    with open(path, 'r') as f:
+        return to_grid(f.readlines())
+
+
+def write_level(path, grid):
+    with open(path, 'w') as f:
+        for row in to_lines(grid):
+            f.write(row + "\n")
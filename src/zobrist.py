@@ -0,0 +1,30 @@
+# zobrist.py
+#
+# By: Ismael Cortez, Nelson Norman
+#
+# Zobrist hashing of level grids.  Every (row, column, tile code) has a fixed
+# random 64-bit key and a grid hashes to the XOR of its tiles' keys.  The
+# keys are drawn from a fixed seed, so hashes agree across processes and runs.
+#
+import numpy as np
+from tiles import CHARACTER_TILES
+
+KEYS_SEED = 20190415
+# (height, width) -> key table of shape (height, width, tile codes)
+_tables = {}
+
+
+def keys(height, width):
+    table = _tables.get((height, width))
+    if table is None:
+        rng = np.random.default_rng([KEYS_SEED, height, width])
+        table = rng.integers(0, 2 ** 64, (height, width, len(CHARACTER_TILES)), dtype=np.uint64)
+        _tables[(height, width)] = table
+    return table
+
+
+def grid_hash(grid):
+    # hash of a whole grid from scratch
+    rows, cols = np.indices(grid.shape)
+    return int(np.bitwise_xor.reduce(keys(*grid.shape)[rows, cols, grid], axis=None))
+